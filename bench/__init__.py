@@ -0,0 +1,13 @@
+"""
+Offline benchmark and load-test suite for ocr_app
+
+Runs the Flask app against local mock servers for the OpenAI Responses API,
+the Anthropic Messages API and Fish Audio, so performance can be measured
+and compared between runs without network access or API credits.
+
+Usage:
+    python -m bench micro --out micro.json
+    python -m bench load --concurrency 8 --requests 200 --latency-ms 300 --out load.json
+    python -m bench compare before.json after.json
+    python -m bench mock --port 8900
+"""
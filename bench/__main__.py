@@ -0,0 +1,107 @@
+"""
+Command line entry point: python -m bench {micro,load,compare,mock}
+"""
+import argparse
+import contextlib
+import sys
+import time
+
+from bench import compare, loadgen, microbench
+from bench.harness import write_json
+from bench.mock_providers import MockProviderServer
+
+
+def _parse_mix(value: str):
+    """Parse "ocr=4,enhanced=2,generate-audio=1" into a weight dict."""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = int(weight or 1)
+    return mix
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Offline ocr_app benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    micro = sub.add_parser("micro", help="Microbenchmark the text/image helpers")
+    micro.add_argument("--repeat", type=int, default=20)
+    micro.add_argument("--no-uploads", action="store_true", help="Skip the photos in ocr_app/uploads")
+    micro.add_argument("--only", nargs="*", help="Function names to run")
+    micro.add_argument("--budget", type=float, default=microbench.DEFAULT_BUDGET_S,
+                       help="Seconds per function/input pair; repeats are cut to fit")
+    micro.add_argument("--slow", action="store_true", help="Also run spell_fix on the long texts")
+    micro.add_argument("--out", help="Write the JSON report here instead of stdout")
+
+    load = sub.add_parser("load", help="Concurrent load test against mock providers")
+    load.add_argument("--concurrency", type=int, default=8)
+    load.add_argument("--requests", type=int, default=200, help="Total requests (ignored with --duration)")
+    load.add_argument("--duration", type=float, help="Run for this many seconds instead")
+    load.add_argument("--latency-ms", type=float, default=300.0)
+    load.add_argument("--jitter-ms", type=float, default=100.0)
+    load.add_argument("--error-rate", type=float, default=0.0)
+    load.add_argument("--mix", type=_parse_mix, help="e.g. ocr=4,enhanced=2,generate-audio=1")
+    load.add_argument("--target", help="Base URL of a running server (skips in-process app and mocks)")
+    load.add_argument("--seed", type=int, default=0)
+    load.add_argument("--admission", action="store_true", help="Keep rate limits and admission control enabled")
+    load.add_argument("--repeat-payloads", action="store_true",
+                      help="Reuse identical payloads (measures cache hits and coalescing instead of provider calls)")
+    load.add_argument("--out", help="Write the JSON report here instead of stdout")
+
+    cmp_parser = sub.add_parser("compare", help="Diff two JSON reports")
+    cmp_parser.add_argument("before")
+    cmp_parser.add_argument("after")
+    cmp_parser.add_argument("--threshold", type=float, default=5.0, help="Regression threshold in percent")
+    cmp_parser.add_argument("--fail-on-regression", action="store_true")
+
+    mock = sub.add_parser("mock", help="Run the mock providers standalone")
+    mock.add_argument("--host", default="127.0.0.1")
+    mock.add_argument("--port", type=int, default=8900)
+    mock.add_argument("--latency-ms", type=float, default=0.0)
+    mock.add_argument("--jitter-ms", type=float, default=0.0)
+    mock.add_argument("--error-rate", type=float, default=0.0)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "micro":
+        # Progress and the app's own logging go to stderr so `> report.json` stays valid JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            report = microbench.run(repeat=args.repeat, include_uploads=not args.no_uploads, only=args.only,
+                                    budget_s=args.budget, slow=args.slow)
+        write_json(report, args.out)
+    elif args.command == "load":
+        with contextlib.redirect_stdout(sys.stderr):
+            report = loadgen.run(
+                concurrency=args.concurrency,
+                total_requests=None if args.duration else args.requests,
+                duration_s=args.duration,
+                latency_ms=args.latency_ms,
+                jitter_ms=args.jitter_ms,
+                error_rate=args.error_rate,
+                mix=args.mix,
+                target=args.target,
+                seed=args.seed,
+                admission=args.admission,
+                repeat_payloads=args.repeat_payloads,
+            )
+        write_json(report, args.out)
+    elif args.command == "compare":
+        regressions = compare.print_comparison(args.before, args.after, args.threshold)
+        if args.fail_on_regression and regressions:
+            return 1
+    elif args.command == "mock":
+        server = MockProviderServer(args.host, args.port, args.latency_ms, args.jitter_ms, args.error_rate).start()
+        print(f"Mock providers listening on {server.base_url}")
+        print("Export these to point the app at the mocks:")
+        for key, value in server.env().items():
+            print(f"  export {key}={value}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
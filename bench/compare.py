@@ -0,0 +1,55 @@
+"""
+Compare two benchmark JSON reports (micro or load) and print the deltas
+"""
+import json
+from typing import Dict, List, Tuple
+
+METRICS = ["p50_ms", "p95_ms", "p99_ms", "mean_ms", "throughput_rps"]
+
+
+def _rows(report: Dict) -> Dict[str, Dict]:
+    if report.get("kind") == "load":
+        rows = dict(report.get("endpoints", {}))
+        rows["<overall>"] = {"throughput_rps": report.get("throughput_rps", 0.0)}
+        return rows
+    return report.get("results", {})
+
+
+def compare(before: Dict, after: Dict) -> List[Tuple[str, str, float, float, float]]:
+    """
+    Diff two reports of the same kind
+
+    Returns:
+        (name, metric, before, after, change_pct) rows for every metric present in both
+    """
+    if before.get("kind") != after.get("kind"):
+        raise ValueError(f"Cannot compare a {before.get('kind')} report with a {after.get('kind')} report")
+    old_rows, new_rows = _rows(before), _rows(after)
+    diffs = []
+    for name in sorted(set(old_rows) & set(new_rows)):
+        for metric in METRICS:
+            old, new = old_rows[name].get(metric), new_rows[name].get(metric)
+            if old is None or new is None:
+                continue
+            change = ((new - old) / old * 100.0) if old else 0.0
+            diffs.append((name, metric, old, new, change))
+    return diffs
+
+
+def print_comparison(before_path: str, after_path: str, threshold_pct: float = 5.0) -> int:
+    """Print the comparison table; returns the number of regressions past the threshold."""
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+
+    regressions = 0
+    print(f"{'name':<48} {'metric':<15} {'before':>12} {'after':>12} {'change':>9}")
+    for name, metric, old, new, change in compare(before, after):
+        # Latency going up or throughput going down is a regression
+        worse = change < -threshold_pct if metric == "throughput_rps" else change > threshold_pct
+        regressions += worse
+        flag = "  REGRESSION" if worse else ""
+        print(f"{name:<48} {metric:<15} {old:>12.3f} {new:>12.3f} {change:>+8.1f}%{flag}")
+    print(f"\n{regressions} regression(s) beyond {threshold_pct:.1f}%")
+    return regressions
@@ -0,0 +1,110 @@
+"""
+Sample image/text corpus for the benchmarks
+
+Images come from ocr_app/uploads (real photos checked into the repo) plus
+synthetic renders at a few sizes, so the corpus works on a fresh clone.
+Texts are built from a fixed paragraph with deterministic OCR-style noise.
+"""
+import glob
+import io
+import os
+import random
+from typing import Dict, List, Tuple
+
+from PIL import Image, ImageDraw, ImageFilter
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UPLOADS_DIR = os.path.join(REPO_ROOT, "ocr_app", "uploads")
+
+BASE_PARAGRAPH = (
+    "I need to finish the lab report before the meeting on Tuesday\n"
+    "Call mom and ask about the 2nd weekend in March\n"
+    "Review the notes from lecture 12 and rewrite the summary\n"
+    "What time does the library close on Friday\n"
+    "Buy groceries milk eggs bread and coffee\n"
+    "Send bloodpress.txt and clay_sample.csv to the professor\n"
+)
+
+# Character confusions typical of OCR output (see manual_replacement)
+OCR_NOISE = [("o", "0"), ("a", "@"), ("t", "+"), ("I", "|"), ("l", "1"), ("m", "rn")]
+
+
+def noisy_text(words: int, noise_rate: float = 0.08, seed: int = 0) -> str:
+    """Build a text of roughly `words` words with OCR-style character noise."""
+    rng = random.Random(seed)
+    base = BASE_PARAGRAPH.split("\n")
+    lines = []
+    count = 0
+    while count < words:
+        line = base[len(lines) % len(base)] or base[0]
+        out = []
+        for word in line.split():
+            if rng.random() < noise_rate:
+                src, dst = OCR_NOISE[rng.randrange(len(OCR_NOISE))]
+                word = word.replace(src, dst, 1)
+            out.append(word)
+        lines.append(" ".join(out))
+        count += len(out)
+    return "\n".join(lines)
+
+
+def text_corpus() -> Dict[str, str]:
+    """Named texts of increasing size."""
+    return {
+        "short_40w": noisy_text(40, seed=1),
+        "page_250w": noisy_text(250, seed=2),
+        "long_1500w": noisy_text(1500, seed=3),
+    }
+
+
+def render_page(size: Tuple[int, int], dark: bool = False, blur: float = 0.0) -> Image.Image:
+    """Render BASE_PARAGRAPH onto a page-sized RGB image."""
+    bg, fg = ((20, 20, 20), (235, 235, 235)) if dark else ((250, 250, 245), (15, 15, 15))
+    img = Image.new("RGB", size, bg)
+    draw = ImageDraw.Draw(img)
+    step = max(12, size[1] // 30)
+    y = step
+    lines = BASE_PARAGRAPH.strip().split("\n")
+    i = 0
+    while y < size[1] - step:
+        draw.text((step, y), lines[i % len(lines)], fill=fg)
+        y += step
+        i += 1
+    if blur:
+        img = img.filter(ImageFilter.GaussianBlur(blur))
+    return img
+
+
+def image_corpus(include_uploads: bool = True) -> Dict[str, Image.Image]:
+    """Named PIL images: synthetic pages plus any photos in ocr_app/uploads."""
+    images = {
+        "synthetic_640x480": render_page((640, 480)),
+        "synthetic_1600x1200": render_page((1600, 1200)),
+        "synthetic_dark_1600x1200": render_page((1600, 1200), dark=True),
+        "synthetic_blurred_1600x1200": render_page((1600, 1200), blur=2.5),
+    }
+    if include_uploads:
+        for path in sorted(glob.glob(os.path.join(UPLOADS_DIR, "*"))):
+            if not os.path.isfile(path):
+                continue
+            try:
+                img = Image.open(path)
+                img.load()
+            except Exception:
+                continue
+            images[f"upload_{os.path.basename(path)}"] = img.convert("RGB")
+    return images
+
+
+def image_bytes(img: Image.Image, fmt: str = "JPEG") -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, quality=85)
+    return buf.getvalue()
+
+
+def upload_payloads(limit: int = 4) -> List[Tuple[str, bytes]]:
+    """(filename, JPEG bytes) pairs used by the load generator for /ocr."""
+    images = image_corpus()
+    # The blurred page is there for the image microbenchmarks; the quality gate rejects it
+    names = sorted(name for name in images if "blurred" not in name)[:limit]
+    return [(f"{name}.jpg", image_bytes(images[name])) for name in names]
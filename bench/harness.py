@@ -0,0 +1,71 @@
+"""
+Shared helpers for the benchmarks: app import, timing stats and JSON output
+"""
+import importlib
+import json
+import math
+import os
+import platform
+import sys
+import time
+from typing import Dict, List, Optional
+
+from bench.corpus import REPO_ROOT
+
+
+def import_app(env: Optional[Dict[str, str]] = None):
+    """
+    Import ocr_app.app with the given environment applied first
+
+    ocr_app.app builds its OpenAI client at import time, so provider URLs and
+    keys have to be in os.environ before the import happens. Dummy keys are
+    filled in so microbenchmarks can import the module without a .env file.
+    """
+    os.environ.update(env or {})
+    os.environ.setdefault("OPENAI_API_KEY", "bench-openai-key")
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    return importlib.import_module("ocr_app.app")
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(samples_ms: List[float]) -> Dict[str, float]:
+    values = sorted(samples_ms)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values), 4),
+        "min_ms": round(values[0], 4),
+        "p50_ms": round(percentile(values, 50), 4),
+        "p95_ms": round(percentile(values, 95), 4),
+        "p99_ms": round(percentile(values, 99), 4),
+        "max_ms": round(values[-1], 4),
+    }
+
+
+def run_metadata(kind: str, config: dict) -> dict:
+    return {
+        "kind": kind,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+    }
+
+
+def write_json(report: dict, out_path: Optional[str]):
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if out_path:
+        with open(out_path, "w") as f:
+            f.write(text + "\n")
+        print(f"Wrote {out_path}")
+    else:
+        print(text)
@@ -0,0 +1,233 @@
+"""
+Concurrent load generator for the ocr_app HTTP endpoints
+
+Starts the mock providers and the Flask app in-process (or targets an
+already running server with --target), fires a weighted mix of requests
+from N worker threads and reports throughput and p50/p95/p99 per endpoint.
+"""
+import itertools
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+import requests
+
+from bench.corpus import text_corpus, upload_payloads
+from bench.harness import import_app, run_metadata, summarize
+from bench.mock_providers import MockProviderServer
+
+DEFAULT_MIX = {"ocr": 4, "enhanced": 2, "generate-audio": 1}
+
+
+class _Request:
+    def __init__(self, endpoint: str, method: str, path: str, **kwargs):
+        self.endpoint = endpoint
+        self.method = method
+        self.path = path
+        self.kwargs = kwargs
+
+    def variant(self, n: int) -> "_Request":
+        """
+        Copy of this request that no cache or in-flight call has seen
+
+        Text fields get a request number appended; images get trailing bytes
+        after the JPEG end marker, which decoders ignore but content hashes don't.
+        """
+        kwargs = dict(self.kwargs)
+        if "json" in kwargs:
+            body = dict(kwargs["json"])
+            for field in ("text", "userInstruction"):
+                if field in body:
+                    body[field] = f"{body[field]} (request {n})"
+            kwargs["json"] = body
+        if "files" in kwargs:
+            kwargs["files"] = {
+                field: (filename, data + f"loadgen-{n}".encode("ascii"), mimetype)
+                for field, (filename, data, mimetype) in kwargs["files"].items()
+            }
+        return _Request(self.endpoint, self.method, self.path, **kwargs)
+
+
+def build_requests(mix: Dict[str, int]) -> List[_Request]:
+    """Expand the endpoint mix into a request template list to cycle through."""
+    uploads = upload_payloads()
+    page_text = text_corpus()["page_250w"]
+    templates = []
+    for endpoint, weight in mix.items():
+        for i in range(weight):
+            if endpoint == "ocr":
+                filename, data = uploads[i % len(uploads)]
+                templates.append(_Request(endpoint, "POST", "/ocr", files={"photo": (filename, data, "image/jpeg")}))
+            elif endpoint == "enhanced":
+                templates.append(_Request(endpoint, "POST", "/api/enhanced", json={
+                    "extractedText": page_text,
+                    "userInstruction": "Turn these notes into study notes",
+                }))
+            elif endpoint == "generate-audio":
+                templates.append(_Request(endpoint, "POST", "/api/generate-audio", json={
+                    "text": page_text[:400],
+                    "useCustomVoice": False,
+                }))
+            else:
+                raise ValueError(f"Unknown endpoint in mix: {endpoint}")
+    return templates
+
+
+class LoadGenerator:
+    def __init__(self, base_url: str, templates: List[_Request], concurrency: int,
+                 total_requests: Optional[int] = None, duration_s: Optional[float] = None,
+                 timeout_s: float = 120.0, repeat_payloads: bool = False):
+        self.base_url = base_url.rstrip("/")
+        self.templates = templates
+        self.concurrency = concurrency
+        self.total_requests = total_requests
+        self.duration_s = duration_s
+        self.timeout_s = timeout_s
+        self.repeat_payloads = repeat_payloads
+        self._cycle = itertools.cycle(templates)
+        self._issued = 0
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, Dict[str, int]] = {}
+        self.audio_urls: List[str] = []
+
+    def _next(self, deadline: Optional[float]) -> Optional[_Request]:
+        with self._lock:
+            if self.total_requests is not None and self._issued >= self.total_requests:
+                return None
+            if deadline is not None and time.perf_counter() >= deadline:
+                return None
+            self._issued += 1
+            req = next(self._cycle)
+            return req if self.repeat_payloads else req.variant(self._issued)
+
+    def _record(self, req: _Request, elapsed_ms: float, status: Optional[int], audio_url: Optional[str]):
+        with self._lock:
+            if status == 200:
+                self.samples.setdefault(req.endpoint, []).append(elapsed_ms)
+                if audio_url:
+                    self.audio_urls.append(audio_url)
+            else:
+                bucket = self.errors.setdefault(req.endpoint, {})
+                key = str(status) if status is not None else "exception"
+                bucket[key] = bucket.get(key, 0) + 1
+
+    def _worker(self, deadline: Optional[float]):
+        session = requests.Session()
+        while True:
+            req = self._next(deadline)
+            if req is None:
+                return
+            start = time.perf_counter()
+            status = None
+            audio_url = None
+            try:
+                resp = session.request(req.method, self.base_url + req.path, timeout=self.timeout_s, **req.kwargs)
+                status = resp.status_code
+                if req.endpoint == "generate-audio" and status == 200:
+                    audio_url = resp.json().get("audioUrl")
+            except Exception as e:
+                print(f"{req.endpoint} request failed: {e}")
+            self._record(req, (time.perf_counter() - start) * 1000.0, status, audio_url)
+
+    def run(self) -> Dict:
+        deadline = time.perf_counter() + self.duration_s if self.duration_s else None
+        threads = [threading.Thread(target=self._worker, args=(deadline,), daemon=True) for _ in range(self.concurrency)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall_s = time.perf_counter() - start
+
+        endpoints = {}
+        for endpoint in sorted(set(self.samples) | set(self.errors)):
+            ok = self.samples.get(endpoint, [])
+            errors = self.errors.get(endpoint, {})
+            endpoints[endpoint] = {
+                **summarize(ok),
+                "errors": errors,
+                "throughput_rps": round(len(ok) / wall_s, 3) if wall_s else 0.0,
+            }
+        completed = sum(len(v) for v in self.samples.values())
+        failed = sum(sum(v.values()) for v in self.errors.values())
+        return {
+            "wall_s": round(wall_s, 3),
+            "completed": completed,
+            "failed": failed,
+            "throughput_rps": round(completed / wall_s, 3) if wall_s else 0.0,
+            "endpoints": endpoints,
+        }
+
+
+def _cleanup_audio(app_module, audio_urls: List[str]):
+    """Delete TTS files produced by the run so benches don't fill uploads/audio."""
+    for url in audio_urls:
+        app_module.store.delete("audio", os.path.basename(url))
+
+
+def run(concurrency: int = 8, total_requests: Optional[int] = 200, duration_s: Optional[float] = None,
+        latency_ms: float = 300.0, jitter_ms: float = 100.0, error_rate: float = 0.0,
+        mix: Optional[Dict[str, int]] = None, target: Optional[str] = None, seed: int = 0,
+        admission: bool = False, repeat_payloads: bool = False) -> Dict:
+    """
+    Run a load test and return the JSON report
+
+    Args:
+        concurrency: Number of client threads
+        total_requests: Stop after this many requests (None to use duration_s)
+        duration_s: Stop after this many seconds (None to use total_requests)
+        latency_ms: Mean latency injected by the mock providers
+        jitter_ms: +/- uniform jitter on the injected latency
+        error_rate: Fraction of provider calls the mocks fail with HTTP 529
+        mix: Relative weights per endpoint (ocr, enhanced, generate-audio)
+        target: Base URL of an already running server; skips the in-process app and mocks
+        seed: Seed for the mock jitter sequence
+        admission: Keep rate limiting/admission control on (off by default so limits don't skew timings)
+        repeat_payloads: Send the same few payloads over and over, measuring the cache/coalescing path;
+            by default every request is unique so each one reaches the providers
+    """
+    mix = mix or DEFAULT_MIX
+    config = {
+        "concurrency": concurrency, "total_requests": total_requests, "duration_s": duration_s,
+        "latency_ms": latency_ms, "jitter_ms": jitter_ms, "error_rate": error_rate,
+        "mix": mix, "target": target, "seed": seed, "admission": admission,
+        "repeat_payloads": repeat_payloads,
+    }
+    templates = build_requests(mix)
+
+    if target:
+        result = LoadGenerator(target, templates, concurrency, total_requests, duration_s,
+                               repeat_payloads=repeat_payloads).run()
+        return {**run_metadata("load", config), **result}
+
+    from werkzeug.serving import make_server
+
+    # The in-process app keeps its search index and artifacts in a throwaway directory,
+    # so a run never writes into ocr_app/uploads
+    with tempfile.TemporaryDirectory(prefix="ocr-bench-") as workdir, \
+            MockProviderServer(latency_ms=latency_ms, jitter_ms=jitter_ms, error_rate=error_rate, seed=seed) as mock:
+        app_module = import_app({
+            **mock.env(),
+            "ADMISSION_ENABLED": "1" if admission else "0",
+            "SEARCH_INDEX_PATH": os.path.join(workdir, "search.sqlite3"),
+            "STORAGE_ROOT": os.path.join(workdir, "storage"),
+            "STORAGE_INDEX_PATH": os.path.join(workdir, "storage", "artifacts.sqlite3"),
+            "STORAGE_GC_INTERVAL": "0",
+        })
+        server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+        gen = LoadGenerator(base_url, templates, concurrency, total_requests, duration_s,
+                            repeat_payloads=repeat_payloads)
+        try:
+            result = gen.run()
+        finally:
+            server.shutdown()
+            _cleanup_audio(app_module, gen.audio_urls)
+        result["provider_calls"] = dict(mock.counts)
+
+    return {**run_metadata("load", config), **result}
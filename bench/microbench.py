@@ -0,0 +1,79 @@
+"""
+Microbenchmarks for the pure-CPU text and image helpers in ocr_app.app
+"""
+import sys
+import time
+from typing import Callable, Dict, List
+
+from bench.corpus import image_corpus, text_corpus
+from bench.harness import import_app, run_metadata, summarize
+
+TEXT_FUNCTIONS = ["spell_fix", "manual_replacement", "add_missing_punctuation"]
+IMAGE_FUNCTIONS = ["looks_handwritten", "auto_invert"]
+# spell_fix takes tens of seconds on texts this long; only run them with slow=True
+SLOW_TEXT_CHARS = 1000
+# Wall-clock budget per (function, input) pair; repeats are cut to fit it
+DEFAULT_BUDGET_S = 2.0
+
+
+def time_call(fn: Callable, arg, repeat: int, budget_s: float = DEFAULT_BUDGET_S) -> List[float]:
+    """
+    Time fn(arg) up to `repeat` times within roughly `budget_s`
+
+    The warmup call is timed too: if it alone exceeds the budget it becomes the
+    only sample, otherwise it sizes how many timed repeats fit.
+    """
+    start = time.perf_counter()
+    fn(arg)
+    warmup_ms = (time.perf_counter() - start) * 1000.0
+    if warmup_ms / 1000.0 >= budget_s:
+        return [warmup_ms]
+    n = max(1, min(repeat, int(budget_s * 1000.0 / max(warmup_ms, 1e-6))))
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn(arg)
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return samples
+
+
+def run(repeat: int = 20, include_uploads: bool = True, only: List[str] = None,
+        budget_s: float = DEFAULT_BUDGET_S, slow: bool = False) -> Dict:
+    """
+    Time each helper over every corpus item
+
+    Args:
+        repeat: Timed iterations per (function, input) pair
+        include_uploads: Also use the photos in ocr_app/uploads
+        only: Restrict to these function names
+        budget_s: Time budget per function/input pair (repeats are reduced to fit)
+        slow: Also run spell_fix on the long texts (tens of seconds per call)
+
+    Returns:
+        Report dict with one entry per function/input
+    """
+    app_module = import_app()
+    texts = text_corpus()
+    images = image_corpus(include_uploads=include_uploads)
+
+    results = {}
+    for name in TEXT_FUNCTIONS:
+        if only and name not in only:
+            continue
+        fn = getattr(app_module, name)
+        for label, text in texts.items():
+            if name == "spell_fix" and len(text) > SLOW_TEXT_CHARS and not slow:
+                continue
+            results[f"{name}[{label}]"] = summarize(time_call(fn, text, repeat, budget_s))
+            print(f"{name}[{label}]: p50 {results[f'{name}[{label}]']['p50_ms']:.3f} ms", file=sys.stderr)
+
+    for name in IMAGE_FUNCTIONS:
+        if only and name not in only:
+            continue
+        fn = getattr(app_module, name)
+        for label, img in images.items():
+            results[f"{name}[{label}]"] = summarize(time_call(fn, img, repeat, budget_s))
+            print(f"{name}[{label}]: p50 {results[f'{name}[{label}]']['p50_ms']:.3f} ms", file=sys.stderr)
+
+    config = {"repeat": repeat, "include_uploads": include_uploads, "only": only, "budget_s": budget_s, "slow": slow}
+    return {**run_metadata("micro", config), "results": results}
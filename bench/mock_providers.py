@@ -0,0 +1,214 @@
+"""
+Local mock servers for the providers ocr_app talks to
+
+A single HTTP server answers all three provider APIs on different paths:
+    POST /v1/responses      OpenAI Responses API (GPT-4.1 vision OCR)
+    POST /v1/messages       Anthropic Messages API (Claude cleanup / enhance)
+    POST /v1/tts[/clone]    Fish Audio TTS (returns a WAV body)
+
+Every request sleeps for `latency_ms` +/- `jitter_ms` before answering so
+the load generator sees realistic provider-bound latency.
+"""
+import io
+import json
+import random
+import threading
+import time
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+MOCK_OCR_TEXT = (
+    "Meeting at 3pm with the design team\n"
+    "Call mom about the weekend\n"
+    "Finish bloodpress.txt analysis and send clay_sample.csv"
+)
+
+
+def make_wav(seconds: float, sample_rate: int = 16000) -> bytes:
+    """Build a silent mono 16-bit WAV of the given duration."""
+    frames = max(1, int(seconds * sample_rate))
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(b"\x00\x00" * frames)
+    return buf.getvalue()
+
+
+class MockProviderServer:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        """
+        Initialize the mock server (call start() to begin serving)
+
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 picks a free port)
+            latency_ms: Mean injected latency per request
+            jitter_ms: Uniform jitter added to/subtracted from the latency
+            error_rate: Fraction of requests answered with HTTP 529 (overloaded)
+            seed: Random seed for reproducible jitter/error sequences
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+        self._counts_lock = threading.Lock()
+        self._thread = None
+
+        handler = type("_BoundHandler", (_MockHandler,), {"mock": self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> Dict[str, str]:
+        """Environment variables that point ocr_app at this server."""
+        return {
+            "OPENAI_API_KEY": "mock-openai-key",
+            "OPENAI_BASE_URL": f"{self.base_url}/v1",
+            "ANTHROPIC_API_KEY": "mock-anthropic-key",
+            "ANTHROPIC_BASE_URL": self.base_url,
+            "FISH_AUDIO_API_KEY": "mock-fish-key",
+            "FISH_AUDIO_BASE_URL": self.base_url,
+        }
+
+    def start(self) -> "MockProviderServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _delay(self) -> float:
+        with self._rng_lock:
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+            fail = self.error_rate > 0 and self._rng.random() < self.error_rate
+        time.sleep(max(0.0, self.latency_ms + jitter) / 1000.0)
+        return fail
+
+    def _count(self, path: str):
+        with self._counts_lock:
+            self.counts[path] = self.counts.get(path, 0) + 1
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    mock: MockProviderServer = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # Keep benchmark output readable
+        pass
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, payload: dict):
+        self._send(status, json.dumps(payload).encode("utf-8"), "application/json")
+
+    def do_POST(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        body = self._read_body()
+        self.mock._count(path)
+
+        if self.mock._delay():
+            self._send_json(529, {"type": "error", "error": {"type": "overloaded_error", "message": "Mock overload"}})
+            return
+
+        if path == "/v1/responses":
+            self._send_json(200, _openai_response(MOCK_OCR_TEXT))
+        elif path == "/v1/messages":
+            self._send_json(200, _anthropic_message(_echo_prompt(body)))
+        elif path in ("/v1/tts", "/v1/tts/clone", "/v1/voice-clone"):
+            text = _tts_text(body, self.headers.get("Content-Type", ""))
+            # Roughly 15 characters per second of speech
+            self._send(200, make_wav(min(30.0, 0.5 + len(text) / 15.0)), "audio/wav")
+        else:
+            self._send_json(404, {"error": f"Unknown mock path {path}"})
+
+
+def _openai_response(text: str) -> dict:
+    return {
+        "id": "resp_mock",
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": "gpt-4.1",
+        "status": "completed",
+        "output": [
+            {
+                "type": "message",
+                "id": "msg_mock",
+                "status": "completed",
+                "role": "assistant",
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }
+        ],
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": {"input_tokens": 800, "output_tokens": len(text.split()), "total_tokens": 800 + len(text.split())},
+    }
+
+
+def _anthropic_message(text: str) -> dict:
+    return {
+        "id": "msg_mock",
+        "type": "message",
+        "role": "assistant",
+        "model": "claude-3-haiku-20240307",
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": "end_turn",
+        "usage": {"input_tokens": 0, "output_tokens": len(text.split())},
+    }
+
+
+def _echo_prompt(body: bytes) -> str:
+    """Answer with the last user message so cleanup/enhance round-trip their input."""
+    try:
+        messages = json.loads(body or b"{}").get("messages") or []
+        content = messages[-1].get("content", "") if messages else ""
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        return content or "Mock response"
+    except (ValueError, AttributeError):
+        return "Mock response"
+
+
+def _tts_text(body: bytes, content_type: str) -> str:
+    if "application/json" in content_type:
+        try:
+            return json.loads(body or b"{}").get("text", "")
+        except ValueError:
+            return ""
+    # Multipart voice-clone uploads: size the clip from the body instead of parsing it
+    return " " * min(len(body) // 100, 450)
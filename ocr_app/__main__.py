@@ -0,0 +1,29 @@
+"""
+Command line entry point: python -m ocr_app batch <dir>
+"""
+import argparse
+import os
+import sys
+
+# The app modules import each other as top-level modules (see app.py)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import batch
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m ocr_app", description="Replae command line tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    batch_parser = sub.add_parser("batch", help="Run OCR -> cleanup -> enhance -> TTS over a directory of images")
+    batch.add_arguments(batch_parser)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "batch":
+        return batch.run_from_args(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,369 @@
+"""
+Admission control for the provider-backed endpoints
+Per-client token-bucket rate limits, per-provider concurrency caps and
+weighted fair queuing so interactive requests aren't starved by batch jobs
+"""
+import functools
+import hashlib
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+from flask import jsonify, request
+
+# Optional shared store for running several nodes
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    redis = None
+
+# route -> (requests per minute, burst)
+DEFAULT_RATE_LIMITS = {
+    "ocr": (30, 10),
+    "enhanced": (20, 5),
+    "generate_audio": (20, 5),
+    "upload_voice": (10, 5),
+    "preview_audio": (30, 10),
+    "search": (120, 30),
+}
+
+# provider -> max concurrent in-flight calls from this process
+DEFAULT_PROVIDER_CONCURRENCY = {
+    "openai": 8,
+    "anthropic": 8,
+    "fish": 4,
+}
+
+# Scheduling weight per priority class (higher gets a larger share of slots)
+PRIORITY_WEIGHTS = {
+    "interactive": 4.0,
+    "batch": 1.0,
+}
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request can't be admitted; carries the Retry-After hint in seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class MemoryBucketStore:
+    """Token buckets held in this process"""
+
+    MAX_KEYS = 100000
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> Tuple[bool, float]:
+        """
+        Take `cost` tokens from the bucket at `key`
+
+        Args:
+            key: Bucket key (route + client)
+            rate: Refill rate in tokens per second
+            capacity: Bucket size (burst)
+            cost: Tokens this request consumes
+
+        Returns:
+            (allowed, retry_after_seconds)
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - last) * rate)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                allowed, retry_after = True, 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                allowed, retry_after = False, (cost - tokens) / rate
+            if len(self._buckets) > self.MAX_KEYS:
+                self._prune(now, rate, capacity)
+        return allowed, retry_after
+
+    def _prune(self, now: float, rate: float, capacity: float):
+        # Buckets that have refilled completely carry no state worth keeping
+        full_after = capacity / rate if rate else 0.0
+        stale = [k for k, (_, last) in self._buckets.items() if now - last >= full_after]
+        for k in stale:
+            del self._buckets[k]
+
+
+class RedisBucketStore:
+    """Token buckets in Redis, shared by every node pointing at the same server"""
+
+    _SCRIPT = """
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens'))
+local last = tonumber(redis.call('HGET', KEYS[1], 'ts'))
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+if tokens == nil then tokens = capacity; last = now end
+tokens = math.min(capacity, tokens + math.max(0, now - last) * rate)
+local allowed = 0
+local retry = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+else
+  retry = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(retry)}
+"""
+
+    def __init__(self, url: str, prefix: str = "admission:"):
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("ADMISSION_STORE points at Redis but the redis package is not installed")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._take = self.client.register_script(self._SCRIPT)
+
+    def take(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> Tuple[bool, float]:
+        allowed, retry_after = self._take(keys=[self.prefix + key], args=[rate, capacity, time.time(), cost])
+        return bool(int(allowed)), float(retry_after)
+
+
+class FairScheduler:
+    """
+    Concurrency cap for one provider with weighted fair queuing
+
+    Up to `max_concurrency` callers hold a slot at once. When all slots are
+    busy, waiters are ordered by virtual finish time (start + 1/weight, per
+    flow), so each client/priority flow gets a share proportional to its
+    weight no matter how many requests it has queued.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int = 256):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self._cond = threading.Condition()
+        self._active = 0
+        self._queue = []
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._last_finish: Dict[str, float] = {}
+        # Moving average of how long a slot is held, for Retry-After estimates
+        self._avg_hold = 1.0
+        self.rejected = 0
+
+    def _retry_after(self) -> float:
+        return max(1.0, self._avg_hold * (len(self._queue) + 1) / self.max_concurrency)
+
+    def acquire(self, flow: str, weight: float = 1.0, timeout: float = 10.0) -> bool:
+        """Wait for a slot; returns False if none was granted within `timeout` seconds."""
+        with self._cond:
+            if self._active < self.max_concurrency and not self._queue:
+                self._active += 1
+                return True
+            if len(self._queue) >= self.max_queue:
+                self.rejected += 1
+                return False
+
+            start = max(self._virtual_time, self._last_finish.get(flow, 0.0))
+            finish = start + 1.0 / max(weight, 1e-6)
+            self._last_finish[flow] = finish
+            # [finish tag, tiebreak, granted, cancelled]
+            ticket = [finish, next(self._seq), False, False]
+            heapq.heappush(self._queue, ticket)
+
+            deadline = time.monotonic() + timeout
+            while not ticket[2]:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    ticket[3] = True
+                    self.rejected += 1
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def release(self):
+        with self._cond:
+            while self._queue:
+                ticket = heapq.heappop(self._queue)
+                if ticket[3]:
+                    continue
+                # Hand the slot straight to the next flow in fair order
+                ticket[2] = True
+                self._virtual_time = ticket[0]
+                self._cond.notify_all()
+                return
+            self._active -= 1
+            self._last_finish.clear()
+
+    @contextmanager
+    def slot(self, flow: str, weight: float = 1.0, timeout: float = 10.0):
+        if not self.acquire(flow, weight, timeout):
+            with self._cond:
+                retry_after = self._retry_after()
+            raise AdmissionRejected(f"{self.name} is at capacity", retry_after)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            held = time.monotonic() - started
+            with self._cond:
+                self._avg_hold = 0.8 * self._avg_hold + 0.2 * held
+            self.release()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "active": self._active,
+                "queued": sum(1 for t in self._queue if not t[3]),
+                "max_concurrency": self.max_concurrency,
+                "rejected": self.rejected,
+                "avg_hold_s": round(self._avg_hold, 3),
+            }
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _key_hash(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+def _create_store():
+    # Share buckets through the cluster's Redis unless a separate store is configured
+    url = os.getenv("ADMISSION_STORE") or os.getenv("SHARED_STATE_URL", "")
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBucketStore(url)
+    return MemoryBucketStore()
+
+
+class AdmissionController:
+    def __init__(self, store=None, rate_limits: Optional[Dict[str, Tuple[int, int]]] = None,
+                 provider_concurrency: Optional[Dict[str, int]] = None, queue_timeout: Optional[float] = None):
+        """
+        Initialize admission control
+
+        Limits default to DEFAULT_RATE_LIMITS / DEFAULT_PROVIDER_CONCURRENCY and
+        can be overridden per route/provider via env vars, e.g.
+        RATE_LIMIT_OCR_PER_MIN=60, RATE_LIMIT_OCR_BURST=20, PROVIDER_CONCURRENCY_FISH=2.
+
+        Args:
+            store: Bucket store (MemoryBucketStore, RedisBucketStore); picked from ADMISSION_STORE if omitted
+            rate_limits: route -> (requests per minute, burst)
+            provider_concurrency: provider -> max concurrent calls
+            queue_timeout: Seconds a request may wait for a provider slot (ADMISSION_QUEUE_TIMEOUT)
+        """
+        self.enabled = os.getenv("ADMISSION_ENABLED", "1") != "0"
+        self.store = store or _create_store()
+        self.rate_limits = {}
+        for route, (per_min, burst) in (rate_limits or DEFAULT_RATE_LIMITS).items():
+            env_key = route.upper()
+            self.rate_limits[route] = (
+                _env_int(f"RATE_LIMIT_{env_key}_PER_MIN", per_min),
+                _env_int(f"RATE_LIMIT_{env_key}_BURST", burst),
+            )
+        self.schedulers = {
+            provider: FairScheduler(provider, _env_int(f"PROVIDER_CONCURRENCY_{provider.upper()}", limit))
+            for provider, limit in (provider_concurrency or DEFAULT_PROVIDER_CONCURRENCY).items()
+        }
+        self.queue_timeout = queue_timeout if queue_timeout is not None else float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+        # X-API-Key is chosen by the client, so it only identifies callers whose key we issued (API_KEYS)
+        self.api_keys = {_key_hash(k.strip()) for k in os.getenv("API_KEYS", "").split(",") if k.strip()}
+
+    def client_id(self) -> str:
+        """
+        Identify the caller: a configured API key if sent, otherwise the remote address
+
+        Unknown keys are ignored, so rotating X-API-Key can't buy fresh rate-limit
+        buckets or storage quota. Behind a load balancer, set TRUSTED_PROXY_HOPS
+        so remote_addr is the real client rather than the balancer.
+        """
+        api_key = request.headers.get("X-API-Key")
+        if api_key:
+            key_hash = _key_hash(api_key)
+            if key_hash in self.api_keys:
+                return "key:" + key_hash[:16]
+        return "ip:" + (request.remote_addr or "unknown")
+
+    def has_api_key(self) -> bool:
+        """True if the caller is identified by a configured API key rather than its address."""
+        return self.client_id().startswith("key:")
+
+    @staticmethod
+    def priority() -> str:
+        value = (request.headers.get("X-Request-Priority") or "interactive").lower()
+        return value if value in PRIORITY_WEIGHTS else "interactive"
+
+    def check_rate(self, route: str, client: str, cost: float = 1.0):
+        """Raise AdmissionRejected if `client` is over its rate limit for `route`."""
+        if route not in self.rate_limits:
+            return
+        per_min, burst = self.rate_limits[route]
+        if per_min <= 0:
+            return
+        allowed, retry_after = self.store.take(f"{route}:{client}", per_min / 60.0, max(burst, 1), cost)
+        if not allowed:
+            raise AdmissionRejected(f"Rate limit exceeded for {route}", retry_after)
+
+    @contextmanager
+    def provider_slot(self, provider: str, client: str, priority: str = "interactive"):
+        scheduler = self.schedulers.get(provider)
+        if scheduler is None:
+            yield
+            return
+        with scheduler.slot(f"{client}:{priority}", PRIORITY_WEIGHTS[priority], self.queue_timeout):
+            yield
+
+    def admit(self, route: str, provider: Optional[str] = None) -> Callable:
+        """Decorator for Flask views: rate-limit by client, then hold a fair-queued provider slot."""
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return view(*args, **kwargs)
+                client = self.client_id()
+                try:
+                    self.check_rate(route, client)
+                    if provider is None:
+                        return view(*args, **kwargs)
+                    with self.provider_slot(provider, client, self.priority()):
+                        return view(*args, **kwargs)
+                except AdmissionRejected as e:
+                    return too_many_requests(str(e), e.retry_after)
+            return wrapper
+        return decorator
+
+    def stats(self) -> dict:
+        return {provider: s.stats() for provider, s in self.schedulers.items()}
+
+
+def too_many_requests(message: str, retry_after: float):
+    retry_after = max(1, int(math.ceil(retry_after)))
+    response = jsonify({"error": message, "retryAfter": retry_after})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+# Global instance
+_admission = None
+
+def get_admission() -> AdmissionController:
+    """Get or create global admission controller"""
+    global _admission
+    if _admission is None:
+        _admission = AdmissionController()
+    return _admission
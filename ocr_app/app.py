@@ -1,5 +1,8 @@
-from flask import Flask, request, render_template, jsonify, send_from_directory
+from flask import Flask, request, render_template, jsonify, send_from_directory, send_file, make_response, Response, stream_with_context, has_request_context
+import functools
 from flask_cors import CORS
+from werkzeug.utils import secure_filename
+from werkzeug.middleware.proxy_fix import ProxyFix
 import pytesseract
 import os
 from PIL import Image, ImageOps, ImageFilter, ImageEnhance
@@ -11,10 +14,26 @@ import cv2
 import ssl
 from spellchecker import SpellChecker
 import uuid
+import sys
+import time
+import io
 
 from openai import OpenAI
 import base64
 
+# Sibling modules are imported by name; make that work when loaded as ocr_app.app too
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from admission import get_admission
+from storage import get_store, QuotaExceeded
+from shared_state import get_cluster, content_key, FORWARDED_HEADER
+from incremental import PageHistory, reocr, text_diff
+from cleanup import selective_cleanup, tesseract_low_confidence_words
+from quality import QualityGate, edge_density
+from local_tts import get_local_tts
+from singleflight import create_singleflight
+from voice_ingest import ingest_voice, VoiceIngestError, UnsupportedFormat
+from search_index import get_search_index, make_title, KIND_TRANSCRIPT, KIND_SCRIPT
+
 # Force-load .env from project root (parent of ocr_app)
 ENV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.env')
 load_dotenv(ENV_PATH)
@@ -42,9 +61,19 @@ else:
 tesseract_path = os.getenv("TESSERACT_CMD", "/opt/homebrew/bin/tesseract")
 pytesseract.pytesseract.tesseract_cmd = tesseract_path
 
+# Claude endpoint (override ANTHROPIC_BASE_URL to point at a proxy or the bench mock server)
+ANTHROPIC_BASE_URL = os.getenv("ANTHROPIC_BASE_URL", "https://api.anthropic.com").rstrip("/")
+ANTHROPIC_MESSAGES_URL = f"{ANTHROPIC_BASE_URL}/v1/messages"
+
 app = Flask(__name__, static_folder="../dist", static_url_path="")
 app.debug = True
+# Behind a load balancer every request comes from the balancer's address; trust
+# X-Forwarded-For from this many proxy hops so client identity is the real caller
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+if TRUSTED_PROXY_HOPS > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS, x_proto=TRUSTED_PROXY_HOPS)
 CORS(app)  # Enable CORS for React frontend
+admission = get_admission()
 
 # Get the directory where app.py is located
 APP_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -55,6 +84,115 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(VOICE_FOLDER, exist_ok=True)
 os.makedirs(AUDIO_FOLDER, exist_ok=True)
 
+# Sharded artifact storage with metadata index and background cleanup
+store = get_store()
+store.start_gc()
+
+# Caches, job status and artifact locations shared between nodes (SHARED_STATE_URL)
+cluster = get_cluster()
+# Deleted or GC'd files must stop being advertised to other nodes and served from cache
+store.on_delete(cluster.forget_artifact)
+pages = PageHistory(cluster, store)
+
+# Rejects blurry/blank/badly exposed photos before they reach GPT-4.1 (QUALITY_* env vars)
+quality_gate = QualityGate()
+
+# Full-text index of transcripts and scripts behind /api/search
+search_index = get_search_index()
+# Clients identified only by IP share documents with everyone behind the same NAT
+# or unconfigured proxy; SEARCH_REQUIRE_API_KEY=1 limits search to API_KEYS callers
+SEARCH_REQUIRE_API_KEY = os.getenv("SEARCH_REQUIRE_API_KEY") == "1"
+
+def search_owner():
+    """Caller's identity in the search index, or None if search is off for this caller"""
+    if SEARCH_REQUIRE_API_KEY and not admission.has_api_key():
+        return None
+    return admission.client_id()
+
+def index_document(doc_key, kind, text, title=None, entry_id=None, page_id=None):
+    """Add a finished transcript/script to the search index; never fails the request"""
+    owner = search_owner()
+    if owner is None:
+        return
+    try:
+        # Keys are per owner: the same image from two clients is two documents
+        search_index.add(f"{owner}:{doc_key}", kind, text, owner=owner, title=title or make_title(text),
+                         entry_id=entry_id, page_id=page_id)
+    except Exception as e:
+        print(f"Search indexing failed: {e}")
+
+# Identical requests arriving together (double-clicks, retries) share one provider call
+flights = create_singleflight(cluster.state)
+
+def coalesce(namespace, key_fn):
+    """Let concurrent requests with the same content key share one run of the view"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = key_fn()
+            if key is None:
+                return view(*args, **kwargs)
+
+            def run():
+                response = make_response(view(*args, **kwargs))
+                return {
+                    "body": response.get_data(as_text=True),
+                    "status": response.status_code,
+                    "mimetype": response.mimetype,
+                    "headers": {h: response.headers[h] for h in ("Retry-After",) if h in response.headers}
+                }
+
+            payload, shared = flights.do(f"{namespace}:{key}", run)
+            response = Response(payload["body"], status=payload["status"], mimetype=payload["mimetype"])
+            response.headers.update(payload["headers"])
+            if shared:
+                response.headers["X-Coalesced"] = "1"
+            return response
+        return wrapper
+    return decorator
+
+def ocr_flight_key():
+    photo = request.files.get("photo")
+    if photo is None:
+        return None
+    img_bytes = photo.read()
+    photo.seek(0)
+    return content_key(admission.client_id(), img_bytes, request.form.get("pageId") or "",
+                       request.form.get("cleanup") or "")
+
+def enhanced_flight_key():
+    data = request.get_json(silent=True) or {}
+    return content_key(admission.client_id(), data.get("extractedText", ""), data.get("userInstruction", ""))
+
+def tts_flight_key():
+    data = request.get_json(silent=True) or {}
+    use_custom_voice = data.get("useCustomVoice", False)
+    return content_key(admission.client_id(), data.get("text", ""), data.get("voiceId") if use_custom_voice else "",
+                       bool(use_custom_voice))
+
+def track_job(kind):
+    """Record a request as a job in shared state so any node can report its outcome"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            job_id = cluster.create_job(kind)
+            try:
+                response = make_response(view(*args, **kwargs))
+            except Exception as e:
+                cluster.update_job(job_id, "failed", error=str(e))
+                raise
+            result = response.get_json(silent=True)
+            if response.status_code == 200:
+                cluster.update_job(job_id, "done", result=result)
+            else:
+                cluster.update_job(job_id, "failed", error=(result or {}).get("error"), statusCode=response.status_code)
+            if isinstance(result, dict):
+                result["jobId"] = job_id
+                response.set_data(jsonify(result).get_data())
+            return response
+        return wrapper
+    return decorator
+
 @app.route("/")
 def index():
     # In production, serve the React build
@@ -65,6 +203,8 @@ def index():
 
 
 @app.route("/ocr", methods=["POST"])
+@coalesce("ocr", ocr_flight_key)
+@admission.admit("ocr", provider="openai")
 def ocr():
     try:
         if "photo" not in request.files:
@@ -78,38 +218,103 @@ def ocr():
         # ---- READ IMAGE BYTES FROM UPLOAD ----
         img_bytes = file.read()
 
-        # ---- BASE64 ENCODE ----
-        import base64
-        b64_image = base64.b64encode(img_bytes).decode("utf-8")
-
-        print("Sending to GPT-4.1 with data:image/... base64…")
-
-        # ---- VISION REQUEST USING EXACT SYNTAX YOU PROVIDED ----
-        response = client.responses.create(
-            model="gpt-4.1",
-            input=[
-                {
-                    "role": "user",
-                    "content": [
-                        { "type": "input_text", "text": "You are a transcription engine. You MUST ONLY output the exact readable text found in the image. No summaries. No interpretation. No corrections. No punctuation changes. No additions. No removals. If unclear text exists, transcribe it as-is (even partial). If nothing is readable, return an empty string."},
-                        {
-                            "type": "input_image",
-                            "image_url": f"data:image/jpeg;base64,{b64_image}",
-                        },
-                    ],
-                }
-            ],
-        )
-
-        # ---- EXTRACT TEXT ----
-        out = response.output_text
-
-        return jsonify({"text": out})
+        # Re-shot of a page we've seen before? (optional pageId form field)
+        page_id = request.form.get("pageId") or None
+        previous = pages.latest(page_id, owner=admission.client_id()) if page_id else None
+        incremental_info = None
+        quality = None
+
+        # Same image already transcribed on any node?
+        cache_key = content_key(img_bytes)
+        out = cluster.cache_get("ocr", cache_key)
+        if out is None:
+            if quality_gate.mode != "off":
+                quality = quality_gate.evaluate(img_bytes)
+                if not quality["ok"]:
+                    return jsonify({
+                        "text": "",
+                        "error": "Image quality too low for OCR",
+                        "reasons": quality["reasons"],
+                        "quality": quality
+                    }), 422
+            if previous:
+                # Only OCR the regions that changed since the last version
+                incremental_info = reocr(previous["imageBytes"], previous["text"], img_bytes, transcribe_image)
+            if incremental_info:
+                out = incremental_info["text"]
+            else:
+                out = transcribe_image(img_bytes)
+            cluster.cache_set("ocr", cache_key, out)
+
+        # Optional LLM repair of low-confidence lines (cleanup=1 form field)
+        if request.form.get("cleanup") in ("1", "true"):
+            use_tesseract = os.getenv("OCR_CLEANUP_TESSERACT") == "1"
+            # Tesseract confidences come from the image, so it's part of the key when they're used
+            clean_key = content_key(out, cache_key if use_tesseract else "")
+            cleaned = cluster.cache_get("ocr-clean", clean_key)
+            if cleaned is None:
+                image = Image.open(io.BytesIO(img_bytes)) if use_tesseract else None
+                try:
+                    cleaned = claude_ocr_cleanup(out, image, strict=True)
+                    cluster.cache_set("ocr-clean", clean_key, cleaned)
+                except Exception as e:
+                    # Serve the raw text this time, but don't cache it as the cleaned version
+                    print("Claude cleanup error:", e)
+                    cleaned = out
+            out = cleaned
+
+        # Re-shots of a page replace its entry; otherwise one entry per distinct image
+        index_document(f"page:{page_id}" if page_id else f"image:{cache_key}", KIND_TRANSCRIPT, out,
+                       entry_id=request.form.get("entryId"), page_id=page_id)
+
+        if not page_id:
+            if quality and quality["reasons"]:
+                # QUALITY_GATE_MODE=flag: OCR anyway, but tell the client why it may be poor
+                return jsonify({"text": out, "quality": quality})
+            return jsonify({"text": out})
+
+        version = pages.save(page_id, img_bytes, out, owner=admission.client_id())
+        return jsonify({
+            "text": out,
+            "pageId": page_id,
+            "version": version,
+            "incremental": incremental_info is not None,
+            "regions": incremental_info["regions"] if incremental_info else None,
+            "diff": text_diff(previous["text"] if previous else "", out),
+            "quality": quality
+        })
 
     except Exception as e:
         print("OCR Error:", e)
         return jsonify({"error": str(e)}), 500
 
+def transcribe_image(img_bytes):
+    """Transcribe an encoded image with GPT-4.1 vision"""
+    # ---- BASE64 ENCODE ----
+    b64_image = base64.b64encode(img_bytes).decode("utf-8")
+
+    print("Sending to GPT-4.1 with data:image/... base64…")
+
+    # ---- VISION REQUEST USING EXACT SYNTAX YOU PROVIDED ----
+    response = client.responses.create(
+        model="gpt-4.1",
+        input=[
+            {
+                "role": "user",
+                "content": [
+                    { "type": "input_text", "text": "You are a transcription engine. You MUST ONLY output the exact readable text found in the image. No summaries. No interpretation. No corrections. No punctuation changes. No additions. No removals. If unclear text exists, transcribe it as-is (even partial). If nothing is readable, return an empty string."},
+                    {
+                        "type": "input_image",
+                        "image_url": f"data:image/jpeg;base64,{b64_image}",
+                    },
+                ],
+            }
+        ],
+    )
+
+    # ---- EXTRACT TEXT ----
+    return response.output_text
+
 def clean_text(t):
     # Preserve punctuation and line structure
     t = t.replace("\n\n", "\n")          # collapse blank lines only
@@ -172,11 +377,10 @@ def looks_handwritten(pil_img):
             gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
 
         # Use edges to estimate structure
-        edges = cv2.Canny(gray, 30, 150)
-        edge_density = edges.mean()
+        density = edge_density(gray)
 
         # Handwriting tends to have FAR fewer sharp edges than printed text
-        return edge_density < 10
+        return density < 10
     except Exception as e:
         print(f"Error in looks_handwritten: {e}")
         return False  # Default to printed text if detection fails
@@ -284,61 +488,83 @@ def add_missing_punctuation(text):
     
     return result
 
-def claude_ocr_cleanup(raw_text):
-    """Send raw/noisy OCR text to Claude to fix errors, reconstruct words, and infer intended text."""
+def claude_ocr_cleanup(raw_text, image=None, strict=False):
+    """
+    Repair noisy OCR text with Claude, sending only the low-confidence lines (see cleanup.py)
+
+    Falls back to the raw text on any error, unless strict is set: then errors
+    (including a missing key or a failed Claude call) are raised, so callers can
+    tell a real result from the fallback before caching it.
+    """
     try:
         anthropic_api_key = os.getenv("ANTHROPIC_API_KEY")
         if not anthropic_api_key:
+            if strict:
+                raise RuntimeError("Missing Claude API key")
             print("Missing Claude API key")
             return raw_text  # fallback
-        
-        system_prompt = """
-You repair noisy OCR text. Your job is to reconstruct what the text was intended to say.
-
-Rules:
-- Fix misread characters (l ↔ I ↔ 1, 0 ↔ O, rn ↔ m, etc.)
-- Fix spacing, punctuation, line breaks.
-- Reconstruct broken/missing words using context.
-- Remove garbage characters.
-- You ARE allowed to infer what the intended English text was.
-- Output clean, natural English.
-- YOU CANNOT EVER, EVER, EVER REPLY WITH MORE THAN JUST THE INFERRED TEXT. DO NOT EXPLAIN YOUR REASONING, JUST PROVIDED THE TEXT.
-"""
-
-        response = requests.post(
-            "https://api.anthropic.com/v1/messages",
-            headers={
-                "x-api-key": anthropic_api_key,
-                "Content-Type": "application/json",
-                "anthropic-version": "2023-06-01"
-            },
-            json={
-                "model": "claude-3-haiku-20240307",
-                "max_tokens": 2000,
-                "system": system_prompt,
-                "messages": [
-                    {"role": "user", "content": raw_text}
-                ]
-            }
-        )
 
-        data = response.json()
-        return data.get("content", [{}])[0].get("text", raw_text)
+        # /ocr holds an openai slot; Claude calls also queue for an anthropic one
+        caller = (admission.client_id(), admission.priority()) if admission.enabled and has_request_context() else None
+
+        def repair(system_prompt, content, max_tokens):
+            if caller is None:
+                return _repair(system_prompt, content, max_tokens)
+            with admission.provider_slot("anthropic", *caller):
+                return _repair(system_prompt, content, max_tokens)
+
+        def _repair(system_prompt, content, max_tokens):
+            response = requests.post(
+                ANTHROPIC_MESSAGES_URL,
+                headers={
+                    "x-api-key": anthropic_api_key,
+                    "Content-Type": "application/json",
+                    "anthropic-version": "2023-06-01"
+                },
+                json={
+                    "model": "claude-3-haiku-20240307",
+                    "max_tokens": max_tokens,
+                    "system": system_prompt,
+                    "messages": [
+                        {"role": "user", "content": content}
+                    ]
+                }
+            )
+            if strict and response.status_code != 200:
+                raise RuntimeError(f"Claude API returned {response.status_code}")
+            data = response.json()
+            return data.get("content", [{}])[0].get("text")
+
+        # Tesseract word confidences sharpen the line scores when an image and the binary are available
+        low_conf_words = None
+        if image is not None and os.getenv("OCR_CLEANUP_TESSERACT") == "1":
+            try:
+                low_conf_words = tesseract_low_confidence_words(image)
+            except Exception as e:
+                print("Tesseract confidence error:", e)
+
+        cleaned, stats = selective_cleanup(raw_text, repair, spell, low_conf_words)
+        print(f"Claude cleanup: {stats}")
+        return cleaned
 
     except Exception as e:
+        if strict:
+            raise
         print("Claude cleanup error:", e)
         return raw_text
 
 
 
-@app.route("/api/enhanced", methods=["POST"])
-def enhanced():
-    try:
-        data = request.get_json()
-        extracted_text = data.get("extractedText", "")
-        user_instruction = data.get("userInstruction", "")
+class EnhanceError(Exception):
+    """Claude couldn't produce a script; carries the details and upstream status for the API response"""
+    def __init__(self, message, details=None, status_code=None):
+        super().__init__(message)
+        self.details = details
+        self.status_code = status_code
 
-        system_prompt = f"""You are converting extracted text into natural first-person speech for audio. Your job is to rephrase and expand the wording ONLY - do not add, interpret, or assume anything. Start immediately with the content - no intros.
+def enhance_text(extracted_text, user_instruction):
+    """Turn extracted text into a first-person speech script with Claude (raises EnhanceError)"""
+    system_prompt = f"""You are converting extracted text into natural first-person speech for audio. Your job is to rephrase and expand the wording ONLY - do not add, interpret, or assume anything. Start immediately with the content - no intros.
 
 ABSOLUTE PROHIBITIONS:
 ❌ "Alright" ❌ "Let me" ❌ "Here are" ❌ "Based on" ❌ "Summary" ❌ "I'll" ❌ "Let's" ❌ "Okay" ❌ "Let's take a look" ❌ "First up" ❌ "I see" ❌ "Looking at"
@@ -408,64 +634,83 @@ CRITICAL RULES:
 
 Remember: Rephrase the words only, don't interpret their meaning."""
 
-        anthropic_api_key = os.getenv("ANTHROPIC_API_KEY")
-        if not anthropic_api_key or anthropic_api_key == "your_claude_key_here":
-            return jsonify({
-                "error": "ANTHROPIC_API_KEY not configured",
-                "details": "Please set your Claude API key in the .env file. Get your key from https://console.anthropic.com/"
-            }), 500
-
-        claude_response = requests.post(
-            "https://api.anthropic.com/v1/messages",
-            headers={
-                "x-api-key": anthropic_api_key,
-                "Content-Type": "application/json",
-                "anthropic-version": "2023-06-01"
-            },
-            json={
-                "model": "claude-3-haiku-20240307",
-                "max_tokens": 4000,
-                "system": system_prompt,
-                "messages": [
-                    {
-                        "role": "user", 
-                        "content": f"{user_instruction}\n\nCRITICAL: Use ONLY the extracted text. NO 'Okay', NO 'Let me', NO 'It's important', NO interpretation. Start immediately with the content. Do not analyze, assume, or explain what things 'might be' or 'probably are'."
-                    }
-                ]
-            }
+    anthropic_api_key = os.getenv("ANTHROPIC_API_KEY")
+    if not anthropic_api_key or anthropic_api_key == "your_claude_key_here":
+        raise EnhanceError(
+            "ANTHROPIC_API_KEY not configured",
+            "Please set your Claude API key in the .env file. Get your key from https://console.anthropic.com/"
         )
 
-        if claude_response.status_code != 200:
-            error_text = claude_response.text
-            print(f"Claude API error (status {claude_response.status_code}): {error_text}")
-            try:
-                error_json = claude_response.json()
-                error_msg = error_json.get("error", {}).get("message", error_text)
-            except:
-                error_msg = error_text
-            return jsonify({
-                "error": "Claude API error",
-                "details": error_msg,
-                "status_code": claude_response.status_code
-            }), 500
+    claude_response = requests.post(
+        ANTHROPIC_MESSAGES_URL,
+        headers={
+            "x-api-key": anthropic_api_key,
+            "Content-Type": "application/json",
+            "anthropic-version": "2023-06-01"
+        },
+        json={
+            "model": "claude-3-haiku-20240307",
+            "max_tokens": 4000,
+            "system": system_prompt,
+            "messages": [
+                {
+                    "role": "user", 
+                    "content": f"{user_instruction}\n\nCRITICAL: Use ONLY the extracted text. NO 'Okay', NO 'Let me', NO 'It's important', NO interpretation. Start immediately with the content. Do not analyze, assume, or explain what things 'might be' or 'probably are'."
+                }
+            ]
+        }
+    )
 
-        claude_data = claude_response.json()
-        content_list = claude_data.get("content", [])
-        
-        if not content_list:
-            return jsonify({
-                "error": "Empty response from Claude",
-                "details": str(claude_data)
-            }), 500
-        
-        script = content_list[0].get("text", "")
-        
-        if not script:
-            return jsonify({
-                "error": "No text in Claude response",
-                "details": str(claude_data)
-            }), 500
+    if claude_response.status_code != 200:
+        error_text = claude_response.text
+        print(f"Claude API error (status {claude_response.status_code}): {error_text}")
+        try:
+            error_json = claude_response.json()
+            error_msg = error_json.get("error", {}).get("message", error_text)
+        except:
+            error_msg = error_text
+        raise EnhanceError("Claude API error", error_msg, claude_response.status_code)
+
+    claude_data = claude_response.json()
+    content_list = claude_data.get("content", [])
+    
+    if not content_list:
+        raise EnhanceError("Empty response from Claude", str(claude_data))
+    
+    script = content_list[0].get("text", "")
+    
+    if not script:
+        raise EnhanceError("No text in Claude response", str(claude_data))
+
+    return script
+
+@app.route("/api/enhanced", methods=["POST"])
+@coalesce("enhanced", enhanced_flight_key)
+@admission.admit("enhanced", provider="anthropic")
+def enhanced():
+    try:
+        data = request.get_json()
+        extracted_text = data.get("extractedText", "")
+        user_instruction = data.get("userInstruction", "")
 
+        cache_key = content_key(extracted_text, user_instruction)
+        cached = cluster.cache_get("enhanced", cache_key)
+        if cached is not None:
+            index_document(f"script:{cache_key}", KIND_SCRIPT, cached, title=user_instruction[:120],
+                           entry_id=data.get("entryId"))
+            return jsonify({ "script": cached })
+
+        try:
+            script = enhance_text(extracted_text, user_instruction)
+        except EnhanceError as e:
+            error = {"error": str(e), "details": e.details}
+            if e.status_code is not None:
+                error["status_code"] = e.status_code
+            return jsonify(error), 500
+
+        cluster.cache_set("enhanced", cache_key, script)
+        index_document(f"script:{cache_key}", KIND_SCRIPT, script, title=user_instruction[:120],
+                       entry_id=data.get("entryId"))
         return jsonify({ "script": script })
 
     except Exception as err:
@@ -477,6 +722,7 @@ Remember: Rephrase the words only, don't interpret their meaning."""
 
 
 @app.route("/api/upload-voice", methods=["POST"])
+@admission.admit("upload_voice")
 def upload_voice():
     """Upload and store MP3 voice file"""
     try:
@@ -498,11 +744,17 @@ def upload_voice():
                 "content_type": content_type
             }), 400
         
+        owner = admission.client_id()
+        try:
+            store.check_quota(owner, request.content_length or 0)
+        except QuotaExceeded as e:
+            return jsonify({"error": str(e)}), 413
+        
         # Generate unique filename
         file_id = str(uuid.uuid4())
-        safe_filename = file.filename or "audio_file"
+        safe_filename = secure_filename(file.filename or "") or "audio_file"
         filename = f"{file_id}_{safe_filename}"
-        filepath = os.path.join(VOICE_FOLDER, filename)
+        filepath = store.new_path("voices", filename)
         
         # Save file
         file.save(filepath)
@@ -510,10 +762,35 @@ def upload_voice():
         if not os.path.exists(filepath):
             return jsonify({"error": "Failed to save file"}), 500
         
+        # Decode once and keep only a short, normalized reference clip for cloning
+        reference = None
+        try:
+            with open(filepath, "rb") as f:
+                reference = ingest_voice(f.read())
+        except UnsupportedFormat as e:
+            print(f"Keeping voice sample as uploaded: {e}")
+        except VoiceIngestError as e:
+            os.remove(filepath)
+            return jsonify({"error": str(e), "filename": file.filename}), 400
+        
+        if reference:
+            os.remove(filepath)
+            filename = f"{file_id}_reference.{reference['format']}"
+            filepath = store.new_path("voices", filename)
+            with open(filepath, "wb") as f:
+                f.write(reference["data"])
+        
+        record = store.commit("voices", filename, filepath, owner=owner, ref=file_id)
+        cluster.register_artifact("voices", filename, ref=file_id)
+        
         return jsonify({
             "success": True,
             "voiceId": file_id,
             "filename": filename,
+            "referenceHash": record["sha256"],
+            "normalized": reference is not None,
+            "durationSec": reference["durationSec"] if reference else None,
+            "inputDurationSec": reference["inputDurationSec"] if reference else None,
             "message": "Voice file uploaded successfully"
         })
     except Exception as e:
@@ -528,6 +805,9 @@ def upload_voice():
         }), 500
     
 @app.route("/api/generate-audio", methods=["POST"])
+@coalesce("tts", tts_flight_key)
+@admission.admit("generate_audio", provider="fish")
+@track_job("generate-audio")
 def generate_audio():
     """Generate audio from text using TTS service"""
     try:
@@ -539,18 +819,38 @@ def generate_audio():
         if not text:
             return jsonify({"error": "No text provided"}), 400
         
+        owner = admission.client_id()
+        try:
+            store.check_quota(owner, 0)
+        except QuotaExceeded as e:
+            return jsonify({"error": str(e)}), 413
+        
+        # Custom voices are keyed by their reference hash, so re-uploads of the same sample share the cache
+        voice_record = store.find_by_ref("voices", voice_id) if use_custom_voice and voice_id else None
+        voice_key = (voice_record or {}).get("sha256") or (voice_id if use_custom_voice else "")
+        
+        # Identical text + voice already synthesized on any node?
+        tts_key = content_key(text, voice_key, bool(use_custom_voice))
+        cached_audio = cluster.cache_get("tts", tts_key)
+        if cached_audio and (store.open_path("audio", cached_audio) or cluster.held_elsewhere("audio", cached_audio)):
+            return jsonify({
+                "success": True,
+                "audioUrl": f"/uploads/audio/{cached_audio}",
+                "message": "Audio generated successfully",
+                "cached": True
+            })
+        
         # Get voice file path if custom voice is requested
         voice_file_path = None
         if use_custom_voice and voice_id:
-            if not os.path.exists(VOICE_FOLDER):
-                return jsonify({"error": "Voice folder not found"}), 404
-            
             # Find voice file by ID
-            voice_files = os.listdir(VOICE_FOLDER)
-            for filename in voice_files:
-                if filename.startswith(voice_id):
-                    voice_file_path = os.path.join(VOICE_FOLDER, filename)
-                    break
+            if voice_record:
+                voice_file_path = store.open_path("voices", voice_record["name"])
+            else:
+                # Uploaded through another node
+                location = cluster.locate_ref("voices", voice_id)
+                if location:
+                    voice_file_path = cluster.pull_artifact(store, "voices", location["name"])
             
             if not voice_file_path or not os.path.exists(voice_file_path):
                 return jsonify({
@@ -572,10 +872,12 @@ def generate_audio():
         # If custom voice was requested, don't allow fallback to default
         use_default_voice_param = not use_custom_voice
         
+        audio_filename = f"tts_{uuid.uuid4().hex}.wav"
         try:
             output_path = tts.generate_audio(
                 text=text,
                 voice_file_path=voice_file_path,
+                output_path=store.new_path("audio", audio_filename),
                 use_default_voice=use_default_voice_param
             )
         except Exception as e:
@@ -612,8 +914,14 @@ def generate_audio():
                 "details": f"Expected file at: {output_path}"
             }), 500
         
+        backend = tts.last_backend()
+        store.commit("audio", audio_filename, output_path, owner=owner)
+        cluster.register_artifact("audio", audio_filename)
+        if backend != "local":
+            # Don't keep serving the offline voice once Fish Audio is back
+            cluster.cache_set("tts", tts_key, audio_filename, artifact=("audio", audio_filename))
+        
         # Return the audio file URL
-        audio_filename = os.path.basename(output_path)
         audio_url = f"/uploads/audio/{audio_filename}"
         
         print(f"Audio generated successfully: {output_path}")
@@ -622,7 +930,8 @@ def generate_audio():
         return jsonify({
             "success": True,
             "audioUrl": audio_url,
-            "message": "Audio generated successfully"
+            "message": "Audio generated successfully",
+            "backend": backend
         })
     except Exception as e:
         import traceback
@@ -635,17 +944,38 @@ def generate_audio():
             "details": error_trace[:1000] if len(error_trace) > 1000 else error_trace
         }), 500
 
+@app.route("/api/preview-audio", methods=["POST"])
+@admission.admit("preview_audio")
+def preview_audio():
+    """Stream a quick offline rendition of the text from the local TTS engine"""
+    data = request.get_json(silent=True) or {}
+    text = data.get("text", "")
+    if not text:
+        return jsonify({"error": "No text provided"}), 400
+    
+    local = get_local_tts()
+    if not local.available:
+        return jsonify({
+            "error": "Local TTS is not available",
+            "details": "Install espeak-ng or set PIPER_MODEL to a Piper voice model."
+        }), 503
+    
+    # WAV with an open-ended length: the first sentence plays while the rest is synthesized
+    return Response(stream_with_context(local.stream_wav(text)), mimetype="audio/wav")
+
 @app.route("/uploads/audio/<path:filename>")
 def serve_audio(filename):
     """Serve generated audio files"""
     try:
-        file_path = os.path.join(AUDIO_FOLDER, filename)
-        if not os.path.exists(file_path):
-            print(f"Audio file not found: {file_path}")
-            print(f"AUDIO_FOLDER: {AUDIO_FOLDER}")
-            print(f"Files in AUDIO_FOLDER: {os.listdir(AUDIO_FOLDER) if os.path.exists(AUDIO_FOLDER) else 'Folder does not exist'}")
+        filename = os.path.basename(filename)
+        file_path = store.open_path("audio", filename)
+        if not file_path and FORWARDED_HEADER not in request.headers:
+            # Generated on another node: copy it here once, then serve locally
+            file_path = cluster.pull_artifact(store, "audio", filename)
+        if not file_path:
+            print(f"Audio file not found: {filename}")
             return jsonify({"error": "Audio file not found"}), 404
-        return send_from_directory(AUDIO_FOLDER, filename)
+        return send_file(file_path)
     except Exception as e:
         print(f"Error serving audio file: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -653,7 +983,81 @@ def serve_audio(filename):
 @app.route("/uploads/voices/<path:filename>")
 def serve_voice(filename):
     """Serve uploaded voice files"""
-    return send_from_directory(VOICE_FOLDER, filename)
+    filename = os.path.basename(filename)
+    file_path = store.open_path("voices", filename)
+    if not file_path and FORWARDED_HEADER not in request.headers:
+        file_path = cluster.pull_artifact(store, "voices", filename)
+    if not file_path:
+        return jsonify({"error": "Voice file not found"}), 404
+    return send_file(file_path)
+
+@app.route("/uploads/images/<path:filename>")
+def serve_image(filename):
+    """Serve stored page images (fetched by other nodes for incremental re-OCR)"""
+    filename = os.path.basename(filename)
+    file_path = store.open_path("images", filename)
+    if not file_path:
+        return jsonify({"error": "Image not found"}), 404
+    return send_file(file_path)
+
+@app.route("/api/jobs/<job_id>")
+def job_status(job_id):
+    """Look up a job's status and result (works from any node)"""
+    job = cluster.get_job(job_id)
+    if not job:
+        return jsonify({"error": "Job not found", "jobId": job_id}), 404
+    return jsonify(job)
+
+@app.route("/api/search")
+@admission.admit("search")
+def search():
+    """Ranked full-text search over the caller's transcripts and scripts"""
+    q = request.args.get("q", "").strip()
+    if not q:
+        return jsonify({"error": "Missing query parameter q"}), 400
+    kind = request.args.get("kind") or None
+    if kind not in (None, KIND_TRANSCRIPT, KIND_SCRIPT):
+        return jsonify({"error": f"kind must be {KIND_TRANSCRIPT} or {KIND_SCRIPT}"}), 400
+    try:
+        limit = int(request.args.get("limit", 20))
+        offset = int(request.args.get("offset", 0))
+    except ValueError:
+        return jsonify({"error": "limit and offset must be integers"}), 400
+
+    owner = search_owner()
+    if owner is None:
+        return jsonify({"error": "Search requires an API key"}), 403
+
+    start = time.perf_counter()
+    results = search_index.search(q, owner=owner, kind=kind, limit=limit, offset=offset)
+    return jsonify({
+        "query": q,
+        "results": results,
+        "elapsedMs": round((time.perf_counter() - start) * 1000.0, 3)
+    })
+
+@app.route("/api/documents/<int:doc_id>")
+def get_document(doc_id):
+    """Full text of a search result"""
+    owner = search_owner()
+    if owner is None:
+        return jsonify({"error": "Search requires an API key"}), 403
+    document = search_index.get(doc_id, owner=owner)
+    if not document:
+        return jsonify({"error": "Document not found"}), 404
+    document.pop("owner_token", None)
+    return jsonify(document)
+
+@app.route("/api/metrics")
+def metrics():
+    """Operational counters: quality gate, admission control, storage, request coalescing and search index size"""
+    return jsonify({
+        "quality": quality_gate.stats(),
+        "admission": admission.stats(),
+        "storage": store.stats(),
+        "singleFlight": flights.stats(),
+        "search": search_index.stats()
+    })
 
 @app.route("/credits")
 def credits():
@@ -0,0 +1,319 @@
+"""
+Headless batch processing
+Runs the OCR -> optional cleanup -> enhance -> TTS pipeline over a directory of
+images without the HTTP server. Results are appended to results.jsonl, which
+doubles as the checkpoint: rerunning skips images that already finished.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+from tts_service import get_tts_service
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff")
+RESULTS_FILE = "results.jsonl"
+MANIFEST_FILE = "manifest.json"
+# Items in these states are not retried on resume
+FINAL_STATUSES = ("ok", "rejected")
+STAGES = ("quality", "ocr", "cleanup", "enhance", "tts")
+
+
+def find_images(input_dir: str, output_dir: str, recursive: bool = False) -> List[str]:
+    """Image paths under input_dir (relative, sorted), skipping the output directory."""
+    output_dir = os.path.abspath(output_dir)
+    found = []
+    for root, dirs, files in os.walk(input_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.abspath(os.path.join(root, d)) != output_dir)
+        for name in files:
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                found.append(os.path.relpath(os.path.join(root, name), input_dir))
+        if not recursive:
+            break
+    return sorted(found)
+
+
+def load_checkpoint(results_path: str) -> Dict[str, Dict]:
+    """Last recorded result per input file (later lines win, so retries supersede failures)."""
+    done = {}
+    if not os.path.exists(results_path):
+        return done
+    with open(results_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Half-written last line from an interrupted run
+                continue
+            done[record["file"]] = record
+    return done
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+class BatchRunner:
+    def __init__(self, input_dir: str, output_dir: Optional[str] = None, workers: int = 4,
+                 cleanup: bool = False, instruction: Optional[str] = None, enhance: bool = True,
+                 tts: bool = True, voice_path: Optional[str] = None, recursive: bool = False,
+                 limit: Optional[int] = None, restart: bool = False):
+        """
+        Initialize a batch run
+
+        Args:
+            input_dir: Directory of images to process
+            output_dir: Where results.jsonl, manifest.json and audio/ go (default <input_dir>/batch_output)
+            workers: Images processed in parallel
+            cleanup: Run the confidence-gated Claude cleanup on each transcript
+            instruction: User instruction for the enhance step
+            enhance: Turn transcripts into speech scripts with Claude
+            tts: Generate audio for each script (or transcript when enhance is off)
+            voice_path: Voice sample to clone; normalized once up front
+            recursive: Also process images in subdirectories
+            limit: Process at most this many pending images
+            restart: Ignore the checkpoint and reprocess everything
+        """
+        self.input_dir = os.path.abspath(input_dir)
+        self.output_dir = os.path.abspath(output_dir or os.path.join(input_dir, "batch_output"))
+        self.audio_dir = os.path.join(self.output_dir, "audio")
+        self.results_path = os.path.join(self.output_dir, RESULTS_FILE)
+        self.workers = max(1, workers)
+        self.cleanup = cleanup
+        self.instruction = instruction or "Turn these notes into a clear spoken summary"
+        self.enhance = enhance
+        self.tts = tts
+        self.voice_path = voice_path
+        self.recursive = recursive
+        self.limit = limit
+        self.restart = restart
+        self._write_lock = threading.Lock()
+        self._app = None
+        self._voice_reference = None
+
+    def _load_app(self):
+        """Import the Flask module for its pipeline functions (no server is started)."""
+        import app
+        return app
+
+    def _prepare_voice(self) -> Optional[str]:
+        """Normalize the voice sample once; every TTS call then sends the compact reference."""
+        if not self.voice_path:
+            return None
+        from voice_ingest import ingest_voice, UnsupportedFormat
+        with open(self.voice_path, "rb") as f:
+            data = f.read()
+        try:
+            reference = ingest_voice(data)
+        except UnsupportedFormat:
+            return os.path.abspath(self.voice_path)
+        path = os.path.join(self.output_dir, f"voice_reference.{reference['format']}")
+        with open(path, "wb") as f:
+            f.write(reference["data"])
+        return path
+
+    def _record(self, record: Dict):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._write_lock:
+            with open(self.results_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def process(self, rel_path: str) -> Dict:
+        """Run the pipeline for one image and checkpoint the result."""
+        app = self._app
+        path = os.path.join(self.input_dir, rel_path)
+        timings: Dict[str, float] = {}
+        record = {"file": rel_path, "status": "failed", "timingsMs": timings}
+        start = time.perf_counter()
+
+        def timed(stage, fn, *args):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                timings[stage] = round((time.perf_counter() - t0) * 1000.0, 1)
+
+        try:
+            with open(path, "rb") as f:
+                img_bytes = f.read()
+            record["sha256"] = hashlib.sha256(img_bytes).hexdigest()
+
+            if app.quality_gate.mode != "off":
+                quality = timed("quality", app.quality_gate.evaluate, img_bytes)
+                if not quality["ok"]:
+                    record.update(status="rejected", reasons=quality["reasons"], quality=quality["metrics"])
+                    return record
+
+            text = timed("ocr", app.transcribe_image, img_bytes)
+            if self.cleanup:
+                text = timed("cleanup", app.claude_ocr_cleanup, text)
+            record["text"] = text
+
+            spoken = text
+            if self.enhance and text.strip():
+                spoken = timed("enhance", app.enhance_text, text, self.instruction)
+                record["script"] = spoken
+
+            if self.tts and spoken.strip():
+                stem = os.path.splitext(rel_path.replace(os.sep, "__"))[0]
+                audio_path = os.path.join(self.audio_dir, f"{stem}_{record['sha256'][:8]}.wav")
+                result = timed("tts", get_tts_service().generate_audio, spoken, self._voice_reference,
+                               audio_path, self._voice_reference is None)
+                if not result:
+                    raise RuntimeError("TTS produced no audio")
+                record["audio"] = os.path.relpath(result, self.output_dir)
+
+            record["status"] = "ok"
+            return record
+        except Exception as e:
+            error = str(e)
+            details = getattr(e, "details", None)
+            record["error"] = f"{error}: {details}" if details else error
+            return record
+        finally:
+            record["totalMs"] = round((time.perf_counter() - start) * 1000.0, 1)
+            self._record(record)
+
+    def run(self) -> Dict:
+        os.makedirs(self.audio_dir, exist_ok=True)
+        if self.restart and os.path.exists(self.results_path):
+            os.remove(self.results_path)
+
+        images = find_images(self.input_dir, self.output_dir, self.recursive)
+        checkpoint = load_checkpoint(self.results_path)
+        pending = [p for p in images if checkpoint.get(p, {}).get("status") not in FINAL_STATUSES]
+        skipped = len(images) - len(pending)
+        if self.limit is not None:
+            pending = pending[:self.limit]
+
+        print(f"{len(images)} images, {skipped} already done, {len(pending)} to process "
+              f"with {self.workers} workers -> {self.output_dir}")
+
+        self._app = self._load_app()
+        self._voice_reference = self._prepare_voice() if self.tts else None
+
+        records: List[Dict] = []
+        started = time.time()
+        wall_start = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="batch")
+        interrupted = False
+        try:
+            futures = {executor.submit(self.process, p): p for p in pending}
+            for i, future in enumerate(as_completed(futures), 1):
+                record = future.result()
+                records.append(record)
+                note = record.get("error") or ",".join(record.get("reasons", []))
+                print(f"[{i}/{len(pending)}] {record['file']}: {record['status']} "
+                      f"({record['totalMs'] / 1000.0:.1f}s){' - ' + note if note else ''}")
+        except KeyboardInterrupt:
+            interrupted = True
+            print("Interrupted; finished items are checkpointed, rerun to continue")
+            executor.shutdown(wait=False, cancel_futures=True)
+        else:
+            executor.shutdown()
+        wall_s = time.perf_counter() - wall_start
+
+        summary = self.summarize(records, wall_s, skipped, len(images))
+        summary["interrupted"] = interrupted
+        manifest = {
+            "inputDir": self.input_dir,
+            "startedAt": started,
+            "options": {
+                "workers": self.workers, "cleanup": self.cleanup, "enhance": self.enhance,
+                "instruction": self.instruction if self.enhance else None, "tts": self.tts,
+                "voice": self.voice_path, "recursive": self.recursive,
+            },
+            "summary": summary,
+        }
+        with open(os.path.join(self.output_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        return summary
+
+    @staticmethod
+    def summarize(records: List[Dict], wall_s: float, skipped: int, total: int) -> Dict:
+        counts: Dict[str, int] = {}
+        for record in records:
+            counts[record["status"]] = counts.get(record["status"], 0) + 1
+        latency = {}
+        for stage in STAGES + ("total",):
+            values = [r["totalMs"] if stage == "total" else r["timingsMs"][stage]
+                      for r in records if stage == "total" or stage in r["timingsMs"]]
+            if values:
+                latency[stage] = {
+                    "count": len(values),
+                    "p50Ms": round(percentile(values, 50), 1),
+                    "p95Ms": round(percentile(values, 95), 1),
+                    "maxMs": round(max(values), 1),
+                }
+        return {
+            "images": total,
+            "skipped": skipped,
+            "processed": len(records),
+            "statuses": counts,
+            "wallSeconds": round(wall_s, 2),
+            "imagesPerMinute": round(len(records) / wall_s * 60.0, 2) if wall_s > 0 else 0.0,
+            "latency": latency,
+        }
+
+
+def print_summary(summary: Dict):
+    print()
+    print(f"Processed {summary['processed']} of {summary['images']} images "
+          f"({summary['skipped']} skipped) in {summary['wallSeconds']}s "
+          f"-> {summary['imagesPerMinute']} images/min")
+    print("Statuses: " + (", ".join(f"{k}={v}" for k, v in sorted(summary["statuses"].items())) or "none"))
+    if summary["latency"]:
+        print(f"{'stage':<10}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+        for stage, row in summary["latency"].items():
+            print(f"{stage:<10}{row['count']:>7}{row['p50Ms']:>10}{row['p95Ms']:>10}{row['maxMs']:>10}")
+
+
+def add_arguments(parser):
+    parser.add_argument("input_dir", help="Directory of images to process")
+    parser.add_argument("--out", help="Output directory (default <input_dir>/batch_output)")
+    parser.add_argument("--workers", type=int, default=4, help="Images processed in parallel")
+    parser.add_argument("--cleanup", action="store_true", help="Repair low-confidence OCR lines with Claude")
+    parser.add_argument("--instruction", help="Instruction for the enhance step")
+    parser.add_argument("--no-enhance", action="store_true", help="Skip the Claude script step")
+    parser.add_argument("--no-tts", action="store_true", help="Skip audio generation")
+    parser.add_argument("--voice", help="Voice sample to clone for all audio")
+    parser.add_argument("--recursive", action="store_true", help="Include subdirectories")
+    parser.add_argument("--limit", type=int, help="Process at most this many pending images")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start over")
+
+
+def run_from_args(args) -> int:
+    if not os.path.isdir(args.input_dir):
+        print(f"Not a directory: {args.input_dir}")
+        return 2
+    runner = BatchRunner(
+        args.input_dir,
+        output_dir=args.out,
+        workers=args.workers,
+        cleanup=args.cleanup,
+        instruction=args.instruction,
+        enhance=not args.no_enhance,
+        tts=not args.no_tts,
+        voice_path=args.voice,
+        recursive=args.recursive,
+        limit=args.limit,
+        restart=args.restart,
+    )
+    summary = runner.run()
+    print_summary(summary)
+    failed = summary["statuses"].get("failed", 0)
+    return 130 if summary["interrupted"] else (1 if failed else 0)
@@ -0,0 +1,187 @@
+"""
+Confidence-gated OCR cleanup
+Scores each transcript line, sends only the low-confidence spans (with a line of
+context either side) to the LLM in as few batched calls as possible, and splices
+the repaired text back in. Clean pages never reach the LLM.
+"""
+import os
+import re
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+# Lines scoring below this are sent for repair
+CONFIDENCE_THRESHOLD = float(os.getenv("OCR_CLEANUP_THRESHOLD", "0.9"))
+# Tesseract word confidence (0-100) below which a word counts as suspicious
+TESSERACT_MIN_CONF = 60
+# Rough character budget per LLM call; spans are packed into calls up to this size
+BATCH_CHAR_BUDGET = 6000
+CONTEXT_LINES = 1
+
+# Characters that show up in normal notes; anything else counts as OCR garbage
+_NORMAL_CHARS = re.compile(r"[A-Za-z0-9\s.,;:!?'\"()\-/&%$#@*+=_\[\]]")
+
+REPAIR_SYSTEM_PROMPT = """
+You repair noisy OCR text. Your job is to reconstruct what the text was intended to say.
+
+Rules:
+- Fix misread characters (l ↔ I ↔ 1, 0 ↔ O, rn ↔ m, etc.)
+- Fix spacing, punctuation, line breaks.
+- Reconstruct broken/missing words using context.
+- Remove garbage characters.
+- You ARE allowed to infer what the intended English text was.
+- Output clean, natural English.
+
+You will receive numbered spans. Each span has <context> lines (for reference only, never repeat them)
+and a <fix> block. Reply with ONLY one <fix id="N">repaired text</fix> block per span, in order,
+keeping the same number of lines as the original <fix> block. No explanations.
+"""
+
+
+def tesseract_low_confidence_words(pil_img) -> Set[str]:
+    """Lowercased words Tesseract read with low confidence (needs the tesseract binary)."""
+    import pytesseract
+
+    data = pytesseract.image_to_data(pil_img, output_type=pytesseract.Output.DICT)
+    low = set()
+    for word, conf in zip(data.get("text", []), data.get("conf", [])):
+        try:
+            conf = float(conf)
+        except (TypeError, ValueError):
+            continue
+        word = word.strip().lower()
+        if word and 0 <= conf < TESSERACT_MIN_CONF:
+            low.add(word)
+    return low
+
+
+def _token_is_clean(token: str, known: Set[str]) -> Optional[bool]:
+    """True/False for dictionary-checkable tokens, None for tokens to ignore (numbers, file names)."""
+    if re.fullmatch(r"\d+([.,:/]\d+)*(st|nd|rd|th|am|pm|%)?", token.lower()):
+        return None
+    if re.fullmatch(r"[\w-]+\.[A-Za-z]{2,4}", token) or "_" in token:
+        # File names like bloodpress.txt / clay_sample.csv aren't dictionary words
+        return None
+    if re.fullmatch(r"[A-Za-z]+(['-][A-Za-z]+)*", token):
+        # it's / don't / well-known: check each part, allowing short contraction suffixes
+        parts = re.split(r"['-]", token.lower())
+        return all(part in known or len(part) <= (1 if i == 0 else 2) for i, part in enumerate(parts))
+    # Letters mixed with digits/symbols ("t0", "c@ll", "+ime") are classic misreads
+    return False
+
+
+def line_confidence(line: str, spell, low_conf_words: Optional[Set[str]] = None) -> float:
+    """
+    Heuristic confidence (0-1) that a transcript line is already clean
+
+    Combines the dictionary hit rate of its tokens (via the spell checker) with
+    the share of garbage characters, and penalizes words Tesseract itself was
+    unsure about.
+    """
+    stripped = line.strip()
+    if not stripped:
+        return 1.0
+
+    garbage = sum(1 for ch in stripped if not _NORMAL_CHARS.match(ch)) / len(stripped)
+
+    tokens = [t.strip(".,;:!?\"()[]") for t in stripped.split()]
+    tokens = [t for t in tokens if t]
+    known = spell.known([w.lower() for t in tokens for w in re.split(r"['-]", t) if w.isalpha()])
+    verdicts = [v for v in (_token_is_clean(t, known) for t in tokens) if v is not None]
+    hit_rate = sum(verdicts) / len(verdicts) if verdicts else 1.0
+
+    score = hit_rate * max(0.0, 1.0 - 3.0 * garbage)
+    if low_conf_words and tokens:
+        unsure = sum(1 for t in tokens if t.lower() in low_conf_words)
+        score *= 1.0 - 0.5 * unsure / len(tokens)
+    return score
+
+
+def find_spans(lines: List[str], scores: List[float], threshold: float) -> List[Tuple[int, int]]:
+    """Group consecutive low-confidence lines into [start, end) spans."""
+    spans = []
+    start = None
+    for i, score in enumerate(scores):
+        if score < threshold and lines[i].strip():
+            if start is None:
+                start = i
+        elif start is not None:
+            spans.append((start, i))
+            start = None
+    if start is not None:
+        spans.append((start, len(lines)))
+    return spans
+
+
+def _format_span(span_id: int, lines: List[str], start: int, end: int) -> str:
+    before = lines[max(0, start - CONTEXT_LINES):start]
+    after = lines[end:end + CONTEXT_LINES]
+    parts = [f'<span id="{span_id}">']
+    parts += [f"<context>{line}</context>" for line in before if line.strip()]
+    parts.append(f'<fix id="{span_id}">' + "\n".join(lines[start:end]) + "</fix>")
+    parts += [f"<context>{line}</context>" for line in after if line.strip()]
+    parts.append("</span>")
+    return "\n".join(parts)
+
+
+def _parse_fixes(reply: str) -> Dict[int, str]:
+    return {int(m.group(1)): m.group(2).strip("\n")
+            for m in re.finditer(r'<fix id="(\d+)">(.*?)</fix>', reply, re.DOTALL)}
+
+
+def selective_cleanup(raw_text: str, repair: Callable[[str, str, int], Optional[str]], spell,
+                      low_conf_words: Optional[Set[str]] = None,
+                      threshold: float = CONFIDENCE_THRESHOLD) -> Tuple[str, Dict]:
+    """
+    Repair only the low-confidence parts of an OCR transcript
+
+    Args:
+        raw_text: OCR output
+        repair: Function (system_prompt, user_content, max_tokens) -> LLM reply text or None
+        spell: SpellChecker instance used for the dictionary hit rate
+        low_conf_words: Optional words Tesseract reported low confidence for
+        threshold: Lines scoring below this are repaired
+
+    Returns:
+        (cleaned text, stats) where stats counts lines, spans, LLM calls and characters sent
+    """
+    lines = raw_text.split("\n")
+    scores = [line_confidence(line, spell, low_conf_words) for line in lines]
+    spans = find_spans(lines, scores, threshold)
+    stats = {"lines": len(lines), "lowConfidenceLines": sum(e - s for s, e in spans),
+             "spans": len(spans), "calls": 0, "charsSent": 0}
+    if not spans:
+        return raw_text, stats
+
+    # Pack spans into as few calls as the budget allows
+    batches: List[List[Tuple[int, str]]] = [[]]
+    size = 0
+    for span_id, (start, end) in enumerate(spans, 1):
+        block = _format_span(span_id, lines, start, end)
+        if batches[-1] and size + len(block) > BATCH_CHAR_BUDGET:
+            batches.append([])
+            size = 0
+        batches[-1].append((span_id, block))
+        size += len(block)
+
+    fixes: Dict[int, str] = {}
+    for batch in batches:
+        content = "\n\n".join(block for _, block in batch)
+        # Repairs are about as long as the input (~4 chars/token); allow 2x for tags and slack
+        fix_chars = sum(len("\n".join(lines[spans[i - 1][0]:spans[i - 1][1]])) for i, _ in batch)
+        max_tokens = min(2000, 64 + fix_chars // 2)
+        stats["calls"] += 1
+        stats["charsSent"] += len(content)
+        reply = repair(REPAIR_SYSTEM_PROMPT, content, max_tokens)
+        if reply:
+            # Ignore ids that weren't in this call, so a confused reply can't overwrite another span
+            ids = {span_id for span_id, _ in batch}
+            fixes.update({i: text for i, text in _parse_fixes(reply).items() if i in ids})
+
+    out = []
+    cursor = 0
+    for span_id, (start, end) in enumerate(spans, 1):
+        out.extend(lines[cursor:start])
+        fixed = fixes.get(span_id)
+        out.extend(fixed.split("\n") if fixed is not None else lines[start:end])
+        cursor = end
+    out.extend(lines[cursor:])
+    return "\n".join(out), stats
@@ -0,0 +1,377 @@
+"""
+Incremental re-OCR for re-shot pages
+Aligns a new photo to the previous version of the page, finds the regions that
+changed, OCRs only those and merges the result into the previous transcript.
+"""
+import difflib
+import hashlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Images are aligned/diffed at this size; boxes are scaled back to full resolution
+WORK_SIZE = 1200
+MIN_INLIERS = 25
+# Above this fraction of changed page area a full re-OCR is cheaper and safer
+MAX_CHANGED_FRACTION = 0.5
+MIN_REGION_AREA = 400
+# A text line is re-OCR'd when this fraction of its ink has no counterpart in the other shot
+BAND_CHANGE_FRACTION = 0.03
+MIN_BAND_CHANGE_PIXELS = 12
+
+
+def decode_gray(img_bytes: bytes) -> Optional[np.ndarray]:
+    buf = np.frombuffer(img_bytes, dtype=np.uint8)
+    return cv2.imdecode(buf, cv2.IMREAD_GRAYSCALE)
+
+
+def _resize(gray: np.ndarray) -> Tuple[np.ndarray, float]:
+    scale = WORK_SIZE / max(gray.shape[:2])
+    if scale >= 1.0:
+        return gray, 1.0
+    return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA), scale
+
+
+def estimate_homography(prev_gray: np.ndarray, new_gray: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Homography mapping previous-image coordinates to new-image coordinates
+
+    Returns:
+        3x3 matrix, or None if the two photos can't be matched reliably
+    """
+    orb = cv2.ORB_create(nfeatures=3000)
+    kp1, des1 = orb.detectAndCompute(prev_gray, None)
+    kp2, des2 = orb.detectAndCompute(new_gray, None)
+    if des1 is None or des2 is None or len(kp1) < MIN_INLIERS or len(kp2) < MIN_INLIERS:
+        return None
+
+    matcher = cv2.BFMatcher(cv2.NORM_HAMMING)
+    good = []
+    for pair in matcher.knnMatch(des1, des2, k=2):
+        # Lowe ratio test
+        if len(pair) == 2 and pair[0].distance < 0.75 * pair[1].distance:
+            good.append(pair[0])
+    if len(good) < MIN_INLIERS:
+        return None
+
+    src = np.float32([kp1[m.queryIdx].pt for m in good]).reshape(-1, 1, 2)
+    dst = np.float32([kp2[m.trainIdx].pt for m in good]).reshape(-1, 1, 2)
+    H, mask = cv2.findHomography(src, dst, cv2.RANSAC, 5.0)
+    if H is None or mask is None or int(mask.sum()) < MIN_INLIERS:
+        return None
+    return H
+
+
+def _ink(gray: np.ndarray) -> np.ndarray:
+    blurred = cv2.GaussianBlur(gray, (3, 3), 0)
+    return cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 31, 15)
+
+
+def _band_union(a: List[Tuple[int, int]], b: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged = []
+    for y0, y1 in sorted(a + b):
+        if merged and y0 <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], y1)
+        else:
+            merged.append([y0, y1])
+    return [(y0, y1) for y0, y1 in merged]
+
+
+def changed_regions(prev_aligned: np.ndarray, new_gray: np.ndarray, valid: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    """
+    Bounding boxes (x, y, w, h) of areas that differ between two aligned images
+
+    Compares binarized ink rather than raw pixels, and only counts ink that has
+    no counterpart within a few pixels in the other image, so exposure changes
+    and small residual misalignment don't show up as edits. Two passes use that
+    unmatched ink:
+
+    - per text line: a line is changed when more than BAND_CHANGE_FRACTION of its
+      ink is unmatched, which catches a word rewritten in place ("eggs" -> "bread")
+      whose strokes mostly overlap the old ones
+    - per blob: larger unmatched areas outside the detected lines, e.g. handwriting
+      added in a margin, closed with a wide kernel into whole line blocks
+    """
+    prev_ink = _ink(prev_aligned)
+    new_ink = _ink(new_gray)
+    tolerance = np.ones((7, 7), np.uint8)
+    added = cv2.bitwise_and(new_ink, cv2.bitwise_not(cv2.dilate(prev_ink, tolerance)))
+    removed = cv2.bitwise_and(prev_ink, cv2.bitwise_not(cv2.dilate(new_ink, tolerance)))
+    mask = cv2.bitwise_or(added, removed)
+    mask[valid == 0] = 0
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((2, 2), np.uint8))
+
+    # Only the area both shots cover counts
+    new_ink[valid == 0] = 0
+    prev_ink[valid == 0] = 0
+    boxes = []
+    for y0, y1 in _band_union(ink_line_bands(new_ink), ink_line_bands(prev_ink)):
+        unmatched = mask[y0:y1]
+        count = cv2.countNonZero(unmatched)
+        if count < MIN_BAND_CHANGE_PIXELS:
+            continue
+        ink = max(cv2.countNonZero(new_ink[y0:y1]), cv2.countNonZero(prev_ink[y0:y1]), 1)
+        if count / ink >= BAND_CHANGE_FRACTION:
+            boxes.append((0, y0, new_gray.shape[1], y1 - y0))
+
+    blobs = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (41, 9)))
+    contours, _ = cv2.findContours(blobs, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    boxes += [b for b in (cv2.boundingRect(c) for c in contours) if b[2] * b[3] >= MIN_REGION_AREA]
+    return merge_boxes(boxes)
+
+
+def merge_boxes(boxes: List[Tuple[int, int, int, int]], gap: int = 8) -> List[Tuple[int, int, int, int]]:
+    """Merge boxes that overlap vertically (same text band), top to bottom."""
+    merged = []
+    for x, y, w, h in sorted(boxes, key=lambda b: b[1]):
+        if merged:
+            mx, my, mw, mh = merged[-1]
+            if y <= my + mh + gap:
+                nx, ny = min(mx, x), min(my, y)
+                merged[-1] = (nx, ny, max(mx + mw, x + w) - nx, max(my + mh, y + h) - ny)
+                continue
+        merged.append((x, y, w, h))
+    return merged
+
+
+def text_line_bands(gray: np.ndarray, min_gap: int = 4) -> List[Tuple[int, int]]:
+    """Vertical (y0, y1) extents of text lines from the horizontal ink projection."""
+    ink = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 31, 15)
+    return ink_line_bands(ink, min_gap)
+
+
+def ink_line_bands(ink: np.ndarray, min_gap: int = 4) -> List[Tuple[int, int]]:
+    """text_line_bands() for an already binarized image."""
+    profile = ink.mean(axis=1)
+    rows = profile > max(2.0, profile.mean() * 0.5)
+    bands = []
+    start = None
+    for y, on in enumerate(rows):
+        if on and start is None:
+            start = y
+        elif not on and start is not None:
+            bands.append([start, y])
+            start = None
+    if start is not None:
+        bands.append([start, len(rows)])
+    # Join bands split by tiny gaps (dots, descenders)
+    joined = []
+    for band in bands:
+        if joined and band[0] - joined[-1][1] <= min_gap:
+            joined[-1][1] = band[1]
+        else:
+            joined.append(band)
+    # Fold slivers (descenders, i-dots at high resolution) into an adjacent line just above or below
+    if len(joined) > 1:
+        typical = float(np.median([y1 - y0 for y0, y1 in joined]))
+        folded = []
+        for i, band in enumerate(joined):
+            if band[1] - band[0] < typical / 3:
+                gap_above = band[0] - folded[-1][1] if folded else np.inf
+                gap_below = joined[i + 1][0] - band[1] if i + 1 < len(joined) else np.inf
+                if min(gap_above, gap_below) <= typical / 2:
+                    if gap_above <= gap_below:
+                        folded[-1][1] = band[1]
+                    else:
+                        joined[i + 1][0] = band[0]
+                    continue
+            folded.append(band)
+        joined = folded
+    return [(y0, y1) for y0, y1 in joined if y1 - y0 >= 3]
+
+
+def _line_band_index(line_count: int, band_count: int) -> List[int]:
+    """Map each transcript line to a text band; proportional when the counts disagree."""
+    if band_count == 0:
+        return [0] * line_count
+    if line_count == band_count:
+        return list(range(line_count))
+    return [min(band_count - 1, int(i * band_count / max(line_count, 1))) for i in range(line_count)]
+
+
+def merge_transcript(prev_text: str, prev_bands: List[Tuple[int, int]],
+                     region_texts: List[Tuple[Tuple[float, float], str]]) -> str:
+    """
+    Splice region transcripts into the previous transcript
+
+    Args:
+        prev_text: Transcript of the previous version
+        prev_bands: Text line bands of the previous image
+        region_texts: ((y0, y1) in previous-image coordinates, text) per changed region
+
+    Returns:
+        Merged transcript: lines whose band overlaps a region are replaced by the
+        region's text, regions over blank space are inserted at their position.
+    """
+    lines = prev_text.split("\n")
+    content_idx = [i for i, line in enumerate(lines) if line.strip()]
+    band_of = dict(zip(content_idx, _line_band_index(len(content_idx), len(prev_bands))))
+
+    replace: Dict[int, str] = {}
+    drop = set()
+    inserts: Dict[int, List[str]] = {}
+    for (y0, y1), text in sorted(region_texts, key=lambda r: r[0][0]):
+        covered = [i for i in content_idx
+                   if prev_bands and prev_bands[band_of[i]][0] < y1 and prev_bands[band_of[i]][1] > y0]
+        if covered:
+            replace[covered[0]] = text
+            drop.update(covered[1:])
+            continue
+        # Blank area: insert before the first line whose band starts below the region
+        position = len(lines)
+        for i in content_idx:
+            if prev_bands and prev_bands[band_of[i]][0] >= y1:
+                position = i
+                break
+        inserts.setdefault(position, []).append(text)
+
+    out = []
+    for i, line in enumerate(lines):
+        out.extend(inserts.get(i, []))
+        if i in drop:
+            continue
+        out.append(replace.get(i, line))
+    out.extend(inserts.get(len(lines), []))
+    return "\n".join(out)
+
+
+def reocr(prev_bytes: bytes, prev_text: str, new_bytes: bytes,
+          transcribe: Callable[[bytes], str]) -> Optional[Dict]:
+    """
+    OCR only what changed between two shots of the same page
+
+    Args:
+        prev_bytes: Encoded image of the previous version
+        prev_text: Transcript of the previous version
+        new_bytes: Encoded image of the new version
+        transcribe: Function turning encoded image bytes into text (the full OCR call)
+
+    Returns:
+        {"text", "regions", "changedFraction"}, or None when the pages can't be
+        aligned or changed too much, in which case the caller should OCR the whole image
+    """
+    prev_full = decode_gray(prev_bytes)
+    new_full = decode_gray(new_bytes)
+    if prev_full is None or new_full is None:
+        return None
+
+    prev_small, prev_scale = _resize(prev_full)
+    new_small, new_scale = _resize(new_full)
+    H = estimate_homography(prev_small, new_small)
+    if H is None:
+        return None
+
+    h, w = new_small.shape[:2]
+    prev_aligned = cv2.warpPerspective(prev_small, H, (w, h))
+    valid = cv2.warpPerspective(np.full(prev_small.shape[:2], 255, np.uint8), H, (w, h))
+    valid = cv2.erode(valid, np.ones((9, 9), np.uint8))
+    if valid.mean() < 255 * 0.5:
+        # Less than half the new shot overlaps the old one
+        return None
+
+    boxes = changed_regions(prev_aligned, new_small, valid)
+    changed = sum(bw * bh for _, _, bw, bh in boxes) / float(w * h)
+    if changed > MAX_CHANGED_FRACTION:
+        return None
+    if not boxes:
+        return {"text": prev_text, "regions": 0, "changedFraction": 0.0}
+
+    new_color = cv2.imdecode(np.frombuffer(new_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    H_inv = np.linalg.inv(H)
+    full_h, full_w = new_full.shape[:2]
+    crops = []
+    spans = []
+    for x, y, bw, bh in boxes:
+        pad = 6
+        # Full-width strips keep whole lines together for the OCR model
+        y0 = max(0, int((y - pad) / new_scale))
+        y1 = min(full_h, int((y + bh + pad) / new_scale))
+        ok, encoded = cv2.imencode(".jpg", new_color[y0:y1, 0:full_w], [cv2.IMWRITE_JPEG_QUALITY, 90])
+        if not ok:
+            return None
+        crops.append(encoded.tobytes())
+        # Project the region's vertical extent into the previous image (full resolution)
+        corners = np.float32([[x, y], [x + bw, y], [x, y + bh], [x + bw, y + bh]]).reshape(-1, 1, 2)
+        prev_pts = cv2.perspectiveTransform(corners, H_inv).reshape(-1, 2) / prev_scale
+        spans.append((float(prev_pts[:, 1].min()), float(prev_pts[:, 1].max())))
+
+    # One at a time: the caller holds a single provider slot for the whole request
+    texts = [transcribe(crop) for crop in crops]
+
+    region_texts = [(span, text.strip()) for span, text in zip(spans, texts)]
+    merged = merge_transcript(prev_text, text_line_bands(prev_full), region_texts)
+    return {"text": merged, "regions": len(boxes), "changedFraction": round(changed, 4)}
+
+
+def segment_hash(line: str) -> str:
+    return hashlib.sha256(line.strip().encode("utf-8")).hexdigest()[:16]
+
+
+def text_diff(old: str, new: str) -> Dict:
+    """
+    Line diff between two transcripts for downstream caches
+
+    Returns:
+        {"ops": [...], "segments": [...]} where ops are difflib opcodes over lines
+        and segments list each new line with its content hash and whether it changed,
+        so enhance/TTS work keyed by segment hash can be reused for unchanged lines.
+    """
+    old_lines = old.split("\n") if old else []
+    new_lines = new.split("\n") if new else []
+    matcher = difflib.SequenceMatcher(a=old_lines, b=new_lines, autojunk=False)
+    ops = []
+    changed_lines = set()
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append({"op": tag, "oldStart": i1, "oldEnd": i2, "newStart": j1, "newEnd": j2})
+            continue
+        ops.append({"op": tag, "oldStart": i1, "oldEnd": i2, "newStart": j1, "newEnd": j2,
+                    "removed": old_lines[i1:i2], "added": new_lines[j1:j2]})
+        changed_lines.update(range(j1, j2))
+    segments = [{"line": i, "hash": segment_hash(line), "changed": i in changed_lines}
+                for i, line in enumerate(new_lines)]
+    return {"ops": ops, "segments": segments, "changedLines": len(changed_lines)}
+
+
+class PageHistory:
+    """Latest image + transcript per page id, so re-shoots can be OCR'd incrementally"""
+
+    def __init__(self, cluster, store):
+        self.cluster = cluster
+        self.store = store
+
+    @staticmethod
+    def _page_key(page_id: str, owner: Optional[str]) -> str:
+        # Page ids are client-chosen, so the same id from two clients must not share a history
+        return hashlib.sha256(f"{owner or ''}\0{page_id}".encode("utf-8")).hexdigest()[:24]
+
+    def latest(self, page_id: str, owner: Optional[str] = None) -> Optional[Dict]:
+        """Previous version of the owner's page as {"version", "text", "image": bytes}, or None."""
+        record = self.cluster.state.get(f"page:{self._page_key(page_id, owner)}")
+        if not record:
+            return None
+        path = self.store.open_path("images", record["image"])
+        if not path:
+            path = self.cluster.pull_artifact(self.store, "images", record["image"])
+        if not path:
+            return None
+        with open(path, "rb") as f:
+            return {**record, "imageBytes": f.read()}
+
+    def save(self, page_id: str, img_bytes: bytes, text: str, owner: Optional[str] = None) -> int:
+        key = self._page_key(page_id, owner)
+        previous = self.cluster.state.get(f"page:{key}")
+        version = (previous["version"] + 1) if previous else 1
+        name = f"page_{key}_v{version}.jpg"
+        path = self.store.new_path("images", name)
+        with open(path, "wb") as f:
+            f.write(img_bytes)
+        self.store.commit("images", name, path, owner=owner, ref=key)
+        self.cluster.register_artifact("images", name, ref=key)
+        # Expire with the location record; an older page just gets a full OCR again
+        self.cluster.state.set(f"page:{key}", {"version": version, "text": text, "image": name},
+                               self.cluster.artifact_ttl)
+        if previous and previous.get("image") != name:
+            self.store.delete("images", previous["image"])
+        return version
@@ -0,0 +1,272 @@
+"""
+Local offline TTS
+CPU text-to-speech through Piper (warm subprocesses) or espeak-ng, used for
+previews and as TTSService's fallback when Fish Audio is unavailable.
+"""
+import io
+import json
+import os
+import queue
+import re
+import shutil
+import struct
+import subprocess
+import tempfile
+import threading
+import uuid
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional
+
+# Text is synthesized in sentence-aligned chunks of about this many characters
+CHUNK_CHARS = 300
+# Seconds a Piper process may take for one chunk before it's considered hung and restarted
+PIPER_TIMEOUT = 60
+
+
+def split_chunks(text: str, max_chars: int = CHUNK_CHARS) -> List[str]:
+    """Split text into sentence-aligned chunks no longer than max_chars (unless one sentence is)."""
+    sentences = [s.strip() for s in re.split(r"(?<=[.!?;:])\s+|\n+", text) if s.strip()]
+    chunks = []
+    current = ""
+    for sentence in sentences:
+        while len(sentence) > max_chars:
+            # Overlong sentence: break at the last space inside the limit
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}".strip()
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class EspeakEngine:
+    """espeak-ng (or espeak) run once per chunk; starts in a few milliseconds, so no warm pool needed"""
+
+    name = "espeak"
+
+    def __init__(self, binary: str, voice: str = "en-us", rate: int = 165):
+        self.binary = binary
+        self.voice = voice
+        self.rate = rate
+
+    def synthesize(self, text: str) -> bytes:
+        result = subprocess.run(
+            [self.binary, "-v", self.voice, "-s", str(self.rate), "--stdout"],
+            input=text.encode("utf-8"),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=60,
+            check=True,
+        )
+        return result.stdout
+
+    def close(self):
+        pass
+
+
+class _PiperProcess:
+    """One long-running `piper --json-input` process; the ONNX model stays loaded between requests"""
+
+    def __init__(self, binary: str, model: str, workdir: str, timeout: Optional[float] = None):
+        self.workdir = workdir
+        self.timeout = timeout or float(os.getenv("PIPER_TIMEOUT", PIPER_TIMEOUT))
+        self.proc = subprocess.Popen(
+            [binary, "--model", model, "--json-input"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+        )
+        # readline() has no timeout, so a reader thread hands lines over through a queue
+        self._lines: "queue.Queue[str]" = queue.Queue()
+        threading.Thread(target=self._read_stdout, name="piper-stdout", daemon=True).start()
+
+    def _read_stdout(self):
+        for line in self.proc.stdout:
+            self._lines.put(line)
+        self._lines.put("")  # EOF
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def synthesize(self, text: str) -> bytes:
+        out_path = os.path.join(self.workdir, f"piper_{uuid.uuid4().hex}.wav")
+        self.proc.stdin.write(json.dumps({"text": text, "output_file": out_path}) + "\n")
+        self.proc.stdin.flush()
+        try:
+            # Piper prints the output path once the file is written
+            try:
+                line = self._lines.get(timeout=self.timeout)
+            except queue.Empty:
+                raise TimeoutError(f"piper produced no output in {self.timeout:g}s")
+            if not line:
+                raise RuntimeError("piper process exited")
+            with open(out_path, "rb") as f:
+                return f.read()
+        finally:
+            if os.path.exists(out_path):
+                os.remove(out_path)
+
+    def close(self, kill: bool = False):
+        if kill:
+            self.proc.kill()
+            self.proc.wait()
+            return
+        try:
+            self.proc.stdin.close()
+            self.proc.wait(timeout=5)
+        except Exception:
+            self.proc.kill()
+
+
+class PiperEngine:
+    """Pool of warm Piper processes, one per worker"""
+
+    name = "piper"
+
+    def __init__(self, binary: str, model: str, workers: int):
+        self.binary = binary
+        self.model = model
+        self.workdir = tempfile.mkdtemp(prefix="piper_")
+        self._pool: "queue.Queue[_PiperProcess]" = queue.Queue()
+        for _ in range(workers):
+            self._pool.put(_PiperProcess(binary, model, self.workdir))
+
+    def synthesize(self, text: str) -> bytes:
+        proc = self._pool.get()
+        try:
+            if not proc.alive():
+                proc = _PiperProcess(self.binary, self.model, self.workdir)
+            return proc.synthesize(text)
+        except Exception:
+            # Don't hand a wedged process to the next caller
+            proc.close(kill=True)
+            proc = _PiperProcess(self.binary, self.model, self.workdir)
+            raise
+        finally:
+            self._pool.put(proc)
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def _read_wav(data: bytes):
+    with wave.open(io.BytesIO(data), "rb") as w:
+        return w.getparams(), w.readframes(w.getnframes())
+
+
+def streaming_wav_header(channels: int, sampwidth: int, framerate: int) -> bytes:
+    """WAV header with unknown length (0xFFFFFFFF sizes), for streaming PCM as it's produced."""
+    byte_rate = framerate * channels * sampwidth
+    return (b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVE"
+            + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, framerate, byte_rate, channels * sampwidth, sampwidth * 8)
+            + b"data" + struct.pack("<I", 0xFFFFFFFF))
+
+
+class LocalTTS:
+    def __init__(self, engine=None, workers: Optional[int] = None):
+        """
+        Initialize local TTS
+
+        Uses Piper when PIPER_MODEL points at a voice model (and `piper` is on PATH or
+        PIPER_BIN), otherwise espeak-ng/espeak. LOCAL_TTS_WORKERS sets the pool size.
+
+        Args:
+            engine: Engine instance to use instead of auto-detection
+            workers: Parallel synthesis workers (defaults to LOCAL_TTS_WORKERS or 2)
+        """
+        self.workers = workers or int(os.getenv("LOCAL_TTS_WORKERS", "2"))
+        self.engine = engine or self._detect_engine()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="local-tts")
+
+    def _detect_engine(self):
+        piper_model = os.getenv("PIPER_MODEL")
+        piper_bin = os.getenv("PIPER_BIN") or shutil.which("piper")
+        if piper_model and piper_bin and os.path.exists(piper_model):
+            try:
+                return PiperEngine(piper_bin, piper_model, self.workers)
+            except OSError as e:
+                print(f"Could not start piper: {e}")
+        espeak_bin = shutil.which("espeak-ng") or shutil.which("espeak")
+        if espeak_bin:
+            return EspeakEngine(espeak_bin, voice=os.getenv("ESPEAK_VOICE", "en-us"))
+        return None
+
+    @property
+    def available(self) -> bool:
+        return self.engine is not None
+
+    def iter_chunks(self, text: str) -> Iterator[bytes]:
+        """
+        Yield one WAV per text chunk, in order, as soon as each is ready
+
+        Chunks are synthesized in parallel on the worker pool; the first one
+        can be played while later ones are still being generated.
+        """
+        if not self.available:
+            raise RuntimeError("No local TTS engine found (install espeak-ng or set PIPER_MODEL)")
+        futures = [self._executor.submit(self.engine.synthesize, chunk) for chunk in split_chunks(text)]
+        try:
+            for future in futures:
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def stream_wav(self, text: str) -> Iterator[bytes]:
+        """Yield a single streaming WAV: header first, then PCM frames chunk by chunk."""
+        header_sent = False
+        for chunk in self.iter_chunks(text):
+            params, frames = _read_wav(chunk)
+            if not header_sent:
+                yield streaming_wav_header(params.nchannels, params.sampwidth, params.framerate)
+                header_sent = True
+            yield frames
+
+    def synthesize(self, text: str, output_path: str) -> Optional[str]:
+        """Synthesize the whole text into one WAV file; returns the path or None if nothing was produced."""
+        params = None
+        with wave.open(output_path, "wb") as out:
+            for chunk in self.iter_chunks(text):
+                chunk_params, frames = _read_wav(chunk)
+                if params is None:
+                    params = chunk_params
+                    out.setnchannels(params.nchannels)
+                    out.setsampwidth(params.sampwidth)
+                    out.setframerate(params.framerate)
+                out.writeframes(frames)
+            if params is None:
+                # wave needs parameters even for an empty file
+                out.setnchannels(1)
+                out.setsampwidth(2)
+                out.setframerate(22050)
+        if params is None:
+            os.remove(output_path)
+            return None
+        return output_path
+
+
+# Global instance
+_local_tts = None
+_local_tts_lock = threading.Lock()
+
+def get_local_tts() -> LocalTTS:
+    """Get or create global local TTS instance"""
+    global _local_tts
+    with _local_tts_lock:
+        if _local_tts is None:
+            _local_tts = LocalTTS()
+    return _local_tts
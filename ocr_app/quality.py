@@ -0,0 +1,206 @@
+"""
+Image quality gate
+Cheap NumPy/OpenCV checks that catch blurry, badly exposed, blank or tiny
+photos before they're sent to the vision model.
+"""
+import io
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Metrics are computed on a copy whose longest side is about this long,
+# so thresholds don't depend on the camera resolution
+ANALYSIS_SIZE = 1000
+# Side of the tiles the text area is split into when looking for clipped patches
+CLIP_TILE = 48
+
+REASON_UNREADABLE = "unreadable_image"
+REASON_TOO_SMALL = "too_small"
+REASON_BLURRY = "blurry"
+REASON_OVEREXPOSED = "overexposed"
+REASON_UNDEREXPOSED = "underexposed"
+REASON_BLANK = "blank"
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def default_thresholds() -> Dict[str, float]:
+    return {
+        "min_side": _env_float("QUALITY_MIN_SIDE", 300),
+        "min_blur_variance": _env_float("QUALITY_MIN_BLUR_VARIANCE", 40.0),
+        "max_clipped_fraction": _env_float("QUALITY_MAX_CLIPPED_FRACTION", 0.5),
+        "min_edge_density": _env_float("QUALITY_MIN_EDGE_DENSITY", 0.5),
+        "min_contrast": _env_float("QUALITY_MIN_CONTRAST", 4.0),
+        "dark_mean": _env_float("QUALITY_DARK_MEAN", 50.0),
+        "bright_mean": _env_float("QUALITY_BRIGHT_MEAN", 245.0),
+    }
+
+
+def edge_density(gray: np.ndarray) -> float:
+    """Mean of the Canny edge map (0-255); also the handwriting heuristic in app.looks_handwritten."""
+    return float(cv2.Canny(gray, 30, 150).mean())
+
+
+def _lost_text_fraction(clipped: np.ndarray, edges: np.ndarray) -> float:
+    """
+    Share of the text area that clipping has wiped out
+
+    The text area is the bounding box of the Canny edge map. It is cut into
+    CLIP_TILE tiles, and a tile counts as lost when it is almost entirely
+    clipped and has no edges left. White margins and the paper between lines
+    don't count, so a sharp page on a white background scores close to 0.
+    """
+    x, y, w, h = cv2.boundingRect(edges)
+    if not w or not h:
+        return 0.0
+    box = (slice(y, y + h), slice(x, x + w))
+    clipped, edges = _tiles(clipped[box]), _tiles(edges[box])
+    lost = (clipped.mean(axis=(1, 3)) > 0.95) & ~edges.any(axis=(1, 3))
+    return float(lost.mean())
+
+
+def _tiles(mask: np.ndarray) -> np.ndarray:
+    """View a mask as (rows, CLIP_TILE, cols, CLIP_TILE), padding the edge tiles with edge values."""
+    pad = [(0, -size % CLIP_TILE) for size in mask.shape]
+    mask = np.pad(mask, pad, mode="edge")
+    return mask.reshape(mask.shape[0] // CLIP_TILE, CLIP_TILE, mask.shape[1] // CLIP_TILE, CLIP_TILE)
+
+
+def _decode_for_analysis(img_bytes: bytes):
+    """Decode to grayscale at reduced size; returns (gray, (width, height) of the original) or (None, None)."""
+    try:
+        original_size = Image.open(io.BytesIO(img_bytes)).size
+    except Exception:
+        return None, None
+    longest = max(original_size)
+    # Let the JPEG decoder downscale in the DCT domain instead of decoding full size
+    flag = cv2.IMREAD_GRAYSCALE
+    for factor, reduced in ((8, cv2.IMREAD_REDUCED_GRAYSCALE_8), (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+                            (2, cv2.IMREAD_REDUCED_GRAYSCALE_2)):
+        if longest / factor >= ANALYSIS_SIZE:
+            flag = reduced
+            break
+    gray = cv2.imdecode(np.frombuffer(img_bytes, dtype=np.uint8), flag)
+    if gray is None:
+        return None, None
+    scale = ANALYSIS_SIZE / max(gray.shape[:2])
+    if scale < 1.0:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return gray, original_size
+
+
+def measure(gray: np.ndarray) -> Dict[str, float]:
+    """Raw quality metrics of a grayscale image."""
+    hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+    total = float(hist.sum()) or 1.0
+    edges = cv2.Canny(gray, 30, 150)
+    return {
+        "blur_variance": float(cv2.Laplacian(gray, cv2.CV_64F).var()),
+        "mean": float(gray.mean()),
+        "contrast": float(gray.std()),
+        "overexposed_fraction": float(hist[250:].sum() / total),
+        "underexposed_fraction": float(hist[:6].sum() / total),
+        "overexposed_text_fraction": _lost_text_fraction(gray >= 250, edges),
+        "underexposed_text_fraction": _lost_text_fraction(gray <= 5, edges),
+        "edge_density": float(edges.mean()),
+    }
+
+
+class QualityGate:
+    def __init__(self, thresholds: Optional[Dict[str, float]] = None, mode: Optional[str] = None):
+        """
+        Initialize the quality gate
+
+        Args:
+            thresholds: Overrides for default_thresholds() (QUALITY_* env vars)
+            mode: "reject" (fail fast), "flag" (report but still OCR) or "off" (QUALITY_GATE_MODE)
+        """
+        self.thresholds = {**default_thresholds(), **(thresholds or {})}
+        self.mode = (mode or os.getenv("QUALITY_GATE_MODE", "reject")).lower()
+        self._lock = threading.Lock()
+        self._counts = {"checked": 0, "passed": 0, "rejected": 0, "flagged": 0}
+        self._reasons: Dict[str, int] = {}
+        self._total_ms = 0.0
+
+    def evaluate(self, img_bytes: bytes) -> Dict:
+        """
+        Check an encoded image
+
+        Returns:
+            {"ok": bool, "reasons": [codes], "metrics": {...}, "elapsedMs": float}
+        """
+        start = time.perf_counter()
+        gray, size = _decode_for_analysis(img_bytes)
+        if gray is None:
+            return self._finish(start, [REASON_UNREADABLE], {})
+
+        t = self.thresholds
+        metrics = measure(gray)
+        metrics["width"], metrics["height"] = size
+        reasons: List[str] = []
+        if min(size) < t["min_side"]:
+            reasons.append(REASON_TOO_SMALL)
+        flat = metrics["contrast"] < t["min_contrast"]
+        if flat or metrics["edge_density"] < t["min_edge_density"]:
+            # No structure at all: a smeared page still has tonal contrast, otherwise blame the
+            # exposure if it's extreme, otherwise the page is empty
+            if not flat and metrics["blur_variance"] < t["min_blur_variance"]:
+                reasons.append(REASON_BLURRY)
+            elif metrics["mean"] < t["dark_mean"]:
+                reasons.append(REASON_UNDEREXPOSED)
+            elif metrics["mean"] > t["bright_mean"]:
+                reasons.append(REASON_OVEREXPOSED)
+            else:
+                reasons.append(REASON_BLANK)
+        else:
+            if metrics["blur_variance"] < t["min_blur_variance"]:
+                reasons.append(REASON_BLURRY)
+            # Judge clipping inside the text area only: a white or black background is
+            # mostly clipped on a perfectly legible page
+            if metrics["overexposed_text_fraction"] > t["max_clipped_fraction"]:
+                reasons.append(REASON_OVEREXPOSED)
+            if metrics["underexposed_text_fraction"] > t["max_clipped_fraction"]:
+                reasons.append(REASON_UNDEREXPOSED)
+        return self._finish(start, reasons, metrics)
+
+    def _finish(self, start: float, reasons: List[str], metrics: Dict) -> Dict:
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        ok = not reasons or self.mode != "reject"
+        with self._lock:
+            self._counts["checked"] += 1
+            self._total_ms += elapsed_ms
+            if not reasons:
+                self._counts["passed"] += 1
+            elif ok:
+                self._counts["flagged"] += 1
+            else:
+                self._counts["rejected"] += 1
+            for reason in reasons:
+                self._reasons[reason] = self._reasons.get(reason, 0) + 1
+        return {
+            "ok": ok,
+            "reasons": reasons,
+            "metrics": {k: round(v, 4) if isinstance(v, float) else v for k, v in metrics.items()},
+            "elapsedMs": round(elapsed_ms, 3),
+        }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            checked = self._counts["checked"]
+            return {
+                "mode": self.mode,
+                "thresholds": dict(self.thresholds),
+                **self._counts,
+                "reasons": dict(self._reasons),
+                "avgMs": round(self._total_ms / checked, 3) if checked else 0.0,
+            }
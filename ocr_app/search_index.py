@@ -0,0 +1,222 @@
+"""
+Transcript search index
+Stores OCR transcripts and enhanced scripts in SQLite with an FTS5 index, so
+past notes can be searched (ranked, with snippets) instead of re-OCR'd.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PATH = os.path.join(APP_DIR, "uploads", "search.sqlite3")
+
+KIND_TRANSCRIPT = "transcript"
+KIND_SCRIPT = "script"
+
+# Title matches count double when ranking
+TITLE_WEIGHT = 2.0
+BODY_WEIGHT = 1.0
+SNIPPET_TOKENS = 16
+MAX_LIMIT = 100
+
+
+def owner_token(owner: Optional[str]) -> Optional[str]:
+    """
+    Single FTS token standing for an owner
+
+    Owners are matched inside the FTS query rather than filtered afterwards, so
+    a search only ranks the caller's own documents, not every match in the index.
+    """
+    if owner is None:
+        return None
+    return "o" + hashlib.sha256(owner.encode("utf-8")).hexdigest()[:20]
+
+
+def build_match_query(q: str) -> Optional[str]:
+    """
+    Turn free text into a safe FTS5 query
+
+    Every word must match (implicit AND); the last word also matches as a
+    prefix while the user is still typing. FTS5 operators in the input are
+    treated as plain words.
+    """
+    terms = re.findall(r"\w+", q.lower())
+    if not terms:
+        return None
+    quoted = [f'"{t}"' for t in terms]
+    if not q[-1:].isspace():
+        quoted[-1] += "*"
+    # Never match the owner_token column
+    return "{body title} : (" + " ".join(quoted) + ")"
+
+
+class TranscriptIndex:
+    SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    doc_key TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    owner TEXT,
+    owner_token TEXT,
+    entry_id TEXT,
+    page_id TEXT,
+    title TEXT NOT NULL DEFAULT '',
+    body TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_owner ON documents (owner, updated_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    body, title, owner_token, content='documents', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS documents_ai AFTER INSERT ON documents BEGIN
+    INSERT INTO documents_fts (rowid, body, title, owner_token) VALUES (new.id, new.body, new.title, new.owner_token);
+END;
+CREATE TRIGGER IF NOT EXISTS documents_ad AFTER DELETE ON documents BEGIN
+    INSERT INTO documents_fts (documents_fts, rowid, body, title, owner_token)
+    VALUES ('delete', old.id, old.body, old.title, old.owner_token);
+END;
+CREATE TRIGGER IF NOT EXISTS documents_au AFTER UPDATE OF body, title, owner_token ON documents BEGIN
+    INSERT INTO documents_fts (documents_fts, rowid, body, title, owner_token)
+    VALUES ('delete', old.id, old.body, old.title, old.owner_token);
+    INSERT INTO documents_fts (rowid, body, title, owner_token) VALUES (new.id, new.body, new.title, new.owner_token);
+END;
+"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        Initialize the index
+
+        Args:
+            db_path: SQLite file (SEARCH_INDEX_PATH, defaults to uploads/search.sqlite3)
+        """
+        self.db_path = db_path or os.getenv("SEARCH_INDEX_PATH", DEFAULT_PATH)
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, doc_key: str, kind: str, body: str, owner: Optional[str] = None, title: str = "",
+            entry_id: Optional[str] = None, page_id: Optional[str] = None) -> Optional[int]:
+        """
+        Index a document, replacing any earlier version with the same doc_key
+
+        A document keeps the owner it was first indexed with: a write for an
+        existing doc_key from a different owner is refused and leaves the row
+        untouched. Callers include the owner in doc_key so this shouldn't happen.
+
+        Returns:
+            The document id, or None if the key belongs to another owner
+        """
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            """INSERT INTO documents (doc_key, kind, owner, owner_token, entry_id, page_id, title, body,
+                                      created_at, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT (doc_key) DO UPDATE SET
+                 entry_id = COALESCE(excluded.entry_id, entry_id),
+                 title = excluded.title, body = excluded.body, updated_at = excluded.updated_at
+               WHERE documents.owner IS excluded.owner
+               RETURNING id""",
+            (doc_key, kind, owner, owner_token(owner), entry_id, page_id, title, body, now, now),
+        ).fetchone()
+        conn.commit()
+        return row[0] if row else None
+
+    def get(self, doc_id: int, owner: Optional[str] = None) -> Optional[Dict]:
+        row = self._conn().execute("SELECT * FROM documents WHERE id = ?", (doc_id,)).fetchone()
+        if not row or (owner is not None and row["owner"] != owner):
+            return None
+        return dict(row)
+
+    def delete(self, doc_key: str):
+        conn = self._conn()
+        conn.execute("DELETE FROM documents WHERE doc_key = ?", (doc_key,))
+        conn.commit()
+
+    def search(self, q: str, owner: Optional[str] = None, kind: Optional[str] = None,
+               limit: int = 20, offset: int = 0) -> List[Dict]:
+        """
+        Ranked full-text search
+
+        Args:
+            q: Free-text query
+            owner: Only return this owner's documents
+            kind: "transcript" or "script" to restrict results
+            limit / offset: Paging (limit capped at MAX_LIMIT)
+
+        Returns:
+            Matches, best first, each with a snippet where hits are wrapped in <mark></mark>
+        """
+        match = build_match_query(q)
+        if match is None:
+            return []
+        sql = f"""SELECT d.id, d.kind, d.entry_id, d.page_id, d.title, d.created_at, d.updated_at,
+                         snippet(documents_fts, 0, '<mark>', '</mark>', '…', {SNIPPET_TOKENS}) AS snippet,
+                         bm25(documents_fts, {BODY_WEIGHT}, {TITLE_WEIGHT}, 0.0) AS rank
+                  FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid
+                  WHERE documents_fts MATCH ?"""
+        if owner is not None:
+            match = f'owner_token : "{owner_token(owner)}" AND ({match})'
+        params: list = [match]
+        if kind:
+            sql += " AND d.kind = ?"
+            params.append(kind)
+        sql += " ORDER BY rank LIMIT ? OFFSET ?"
+        params += [max(1, min(limit, MAX_LIMIT)), max(0, offset)]
+        results = []
+        for row in self._conn().execute(sql, params):
+            item = dict(row)
+            # bm25() is lower-is-better; flip it so clients can treat it as a score
+            item["score"] = round(-item.pop("rank"), 4)
+            results.append(item)
+        return results
+
+    def optimize(self):
+        """Merge FTS segments; worth running after large bulk imports."""
+        conn = self._conn()
+        conn.execute("INSERT INTO documents_fts (documents_fts) VALUES ('optimize')")
+        conn.commit()
+
+    def stats(self) -> Dict:
+        rows = self._conn().execute("SELECT kind, COUNT(*) FROM documents GROUP BY kind")
+        return {kind: count for kind, count in rows}
+
+
+def make_title(text: str, limit: int = 120) -> str:
+    """First non-empty line of a text, shortened for display."""
+    for line in text.splitlines():
+        line = line.strip()
+        if line:
+            return line if len(line) <= limit else line[:limit - 1].rstrip() + "…"
+    return ""
+
+
+# Global instance
+_index = None
+_index_lock = threading.Lock()
+
+def get_search_index() -> TranscriptIndex:
+    """Get or create global search index"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = TranscriptIndex()
+    return _index
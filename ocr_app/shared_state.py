@@ -0,0 +1,343 @@
+"""
+Shared state for running several app nodes behind a load balancer
+Key/value backends (memory, SQLite, Redis) plus caches, job status and artifact locations on top
+"""
+import hashlib
+import itertools
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+
+# Optional Redis backend for real multi-host deployments
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    redis = None
+
+# Header set on node-to-node artifact fetches so a miss never bounces between nodes
+FORWARDED_HEADER = "X-Replae-Forwarded"
+
+
+class MemoryState:
+    """Process-local key/value store (single node, and the default)"""
+
+    def __init__(self, max_keys: Optional[int] = None):
+        """
+        Args:
+            max_keys: Size cap (STATE_MAX_KEYS, default 100000); past it, expired keys are purged
+                and then the oldest-written keys evicted
+        """
+        self._data: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self.max_keys = max_keys or int(os.getenv("STATE_MAX_KEYS", "100000"))
+
+    def _live(self, key: str, now: float):
+        item = self._data.get(key)
+        if item and item[1] is not None and item[1] <= now:
+            del self._data[key]
+            return None
+        return item
+
+    def _put(self, key: str, value: Any, ttl: Optional[float], now: float):
+        # Re-insert so dict order stays oldest-written first
+        self._data.pop(key, None)
+        self._data[key] = (value, now + ttl if ttl else None)
+        if len(self._data) > self.max_keys:
+            expired = [k for k, (_, exp) in self._data.items() if exp is not None and exp <= now]
+            for k in expired:
+                del self._data[k]
+            # Evict a tenth at a time so a full store doesn't rescan on every write
+            excess = len(self._data) - self.max_keys * 9 // 10
+            if excess > 0 and len(self._data) > self.max_keys:
+                for k in list(itertools.islice(self._data, excess)):
+                    del self._data[k]
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._live(key, time.time())
+            return item[0] if item else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        with self._lock:
+            self._put(key, value, ttl, time.time())
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """Set `key` only if it doesn't exist; returns True if this call set it."""
+        with self._lock:
+            now = time.time()
+            if self._live(key, now):
+                return False
+            self._put(key, value, ttl, now)
+            return True
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class SQLiteState:
+    """
+    Key/value store in a SQLite file
+    Lets several processes on one host (or a shared volume) share state without
+    running Redis; also the stand-in used for local multi-node testing.
+    """
+
+    def __init__(self, db_path: str, purge_every: Optional[int] = None):
+        """
+        Args:
+            db_path: SQLite file
+            purge_every: Delete expired rows after this many writes (STATE_PURGE_EVERY, default 1000);
+                reads skip expired rows, but nothing else removes them
+        """
+        self.db_path = db_path
+        self.purge_every = purge_every or int(os.getenv("STATE_PURGE_EVERY", "1000"))
+        self._writes = itertools.count(1)
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _wrote(self):
+        if next(self._writes) % self.purge_every == 0:
+            self.purge_expired()
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.time() + ttl if ttl else None
+        self._conn().execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), expires_at),
+        )
+        self._wrote()
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM kv WHERE key = ? AND expires_at IS NOT NULL AND expires_at <= ?", (key, now))
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), now + ttl if ttl else None),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._wrote()
+        return cur.rowcount == 1
+
+    def delete(self, key: str):
+        self._conn().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def purge_expired(self):
+        self._conn().execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+
+
+class RedisState:
+    """Key/value store in Redis (or anything speaking its protocol)"""
+
+    def __init__(self, url: str, prefix: str = "replae:"):
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("SHARED_STATE_URL points at Redis but the redis package is not installed")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self.client.set(self.prefix + key, json.dumps(value), px=int(ttl * 1000) if ttl else None)
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        return bool(self.client.set(self.prefix + key, json.dumps(value), nx=True, px=int(ttl * 1000) if ttl else None))
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+
+
+def create_state(url: Optional[str] = None):
+    """Pick a backend from SHARED_STATE_URL: redis://..., sqlite:///path/to/state.db, or in-memory."""
+    url = url if url is not None else os.getenv("SHARED_STATE_URL", "")
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisState(url)
+    if url.startswith("sqlite:///"):
+        return SQLiteState(url[len("sqlite:///"):])
+    return MemoryState()
+
+
+def content_key(*parts) -> str:
+    """Stable cache key from text/bytes parts."""
+    h = hashlib.sha256()
+    for part in parts:
+        data = part if isinstance(part, bytes) else str(part).encode("utf-8")
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+class Cluster:
+    def __init__(self, state=None, node_id: Optional[str] = None, node_url: Optional[str] = None):
+        """
+        Initialize cluster state for this node
+
+        Args:
+            state: Key/value backend (picked from SHARED_STATE_URL if omitted)
+            node_id: Unique node name (NODE_ID, defaults to hostname:pid)
+            node_url: Base URL other nodes can reach this one at (NODE_URL), e.g. http://10.0.0.5:5001
+        """
+        self.state = state or create_state()
+        self.node_id = node_id or os.getenv("NODE_ID") or f"{socket.gethostname()}:{os.getpid()}"
+        self.node_url = (node_url or os.getenv("NODE_URL", "")).rstrip("/")
+        self.cache_ttl = float(os.getenv("CACHE_TTL", 24 * 3600))
+        # CACHE_ENABLED=0 (or CACHE_TTL=0) turns the result caches off, e.g. for benchmarking
+        self.cache_enabled = os.getenv("CACHE_ENABLED", "1") != "0" and self.cache_ttl > 0
+        self.job_ttl = float(os.getenv("JOB_TTL", 24 * 3600))
+        self.artifact_ttl = float(os.getenv("ARTIFACT_LOCATION_TTL", 30 * 24 * 3600))
+
+    # ---- Caches ----
+
+    def cache_get(self, namespace: str, key: str) -> Optional[Any]:
+        if not self.cache_enabled:
+            return None
+        return self.state.get(f"cache:{namespace}:{key}")
+
+    def cache_set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None,
+                  artifact: Optional[Tuple[str, str]] = None):
+        """
+        Cache a value
+
+        Args:
+            artifact: (kind, name) of a stored file the value points at; forget_artifact()
+                drops the entry when that file is deleted
+        """
+        if not self.cache_enabled:
+            return
+        ttl = ttl if ttl is not None else self.cache_ttl
+        self.state.set(f"cache:{namespace}:{key}", value, ttl)
+        if artifact:
+            kind, name = artifact
+            self.state.set(f"artifact-cache:{kind}:{name}", f"cache:{namespace}:{key}", ttl)
+
+    # ---- Jobs ----
+
+    def create_job(self, kind: str, **meta) -> str:
+        job_id = uuid.uuid4().hex
+        self.state.set(f"job:{job_id}", {
+            "jobId": job_id, "kind": kind, "status": "running", "node": self.node_id,
+            "createdAt": time.time(), "updatedAt": time.time(), **meta,
+        }, self.job_ttl)
+        return job_id
+
+    def update_job(self, job_id: str, status: str, **fields):
+        job = self.state.get(f"job:{job_id}") or {"jobId": job_id}
+        job.update(fields, status=status, updatedAt=time.time())
+        self.state.set(f"job:{job_id}", job, self.job_ttl)
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        return self.state.get(f"job:{job_id}")
+
+    # ---- Artifact locations ----
+
+    def register_artifact(self, kind: str, name: str, ref: Optional[str] = None):
+        """Record that this node holds kind/name so other nodes can fetch it."""
+        location = {"node": self.node_id, "url": self.node_url, "name": name}
+        self.state.set(f"artifact:{kind}:{name}", location, self.artifact_ttl)
+        if ref:
+            self.state.set(f"artifact-ref:{kind}:{ref}", location, self.artifact_ttl)
+
+    def locate_artifact(self, kind: str, name: str) -> Optional[Dict]:
+        return self.state.get(f"artifact:{kind}:{name}")
+
+    def locate_ref(self, kind: str, ref: str) -> Optional[Dict]:
+        return self.state.get(f"artifact-ref:{kind}:{ref}")
+
+    def held_elsewhere(self, kind: str, name: str) -> bool:
+        """True if another node has registered kind/name (this node's own records say nothing about its disk)."""
+        location = self.locate_artifact(kind, name)
+        return bool(location and location.get("url") and location.get("node") != self.node_id)
+
+    def forget_artifact(self, kind: str, name: str, ref: Optional[str] = None):
+        """
+        Drop this node's location records for a deleted artifact, and any cache entry pointing at it
+
+        Records naming another node are left alone: deleting a replica doesn't
+        remove the original.
+        """
+        location = self.locate_artifact(kind, name)
+        if location and location.get("node") == self.node_id:
+            self.state.delete(f"artifact:{kind}:{name}")
+            cache_key = self.state.get(f"artifact-cache:{kind}:{name}")
+            if cache_key:
+                self.state.delete(cache_key)
+                self.state.delete(f"artifact-cache:{kind}:{name}")
+        if ref:
+            location = self.locate_ref(kind, ref)
+            if location and location.get("node") == self.node_id and location.get("name") == name:
+                self.state.delete(f"artifact-ref:{kind}:{ref}")
+
+    def pull_artifact(self, store, kind: str, name: str) -> Optional[str]:
+        """
+        Copy an artifact held by another node into the local store
+
+        Returns:
+            Local path of the copy, or None if no other node has it
+        """
+        location = self.locate_artifact(kind, name)
+        if not location or not location.get("url") or location.get("node") == self.node_id:
+            return None
+        try:
+            response = requests.get(
+                f"{location['url']}/uploads/{kind}/{name}",
+                headers={FORWARDED_HEADER: self.node_id},
+                stream=True,
+                timeout=60,
+            )
+            if response.status_code != 200:
+                print(f"Artifact fetch from {location['node']} returned {response.status_code}")
+                return None
+            path = store.new_path(kind, name)
+            with open(path, "wb") as f:
+                for block in response.iter_content(1024 * 1024):
+                    f.write(block)
+        except Exception as e:
+            print(f"Artifact fetch from {location['node']} failed: {e}")
+            return None
+        # Replica copies don't count against the uploader's quota
+        store.commit(kind, name, path)
+        return store.open_path(kind, name)
+
+
+# Global instance
+_cluster = None
+
+def get_cluster() -> Cluster:
+    """Get or create global cluster state"""
+    global _cluster
+    if _cluster is None:
+        _cluster = Cluster()
+    return _cluster
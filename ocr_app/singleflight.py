@@ -0,0 +1,154 @@
+"""
+Single-flight request coalescing
+Concurrent calls with the same key share one computation: the first caller runs
+it, everyone else waits and gets the same result (or the same exception).
+"""
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from shared_state import MemoryState
+
+
+class FlightFailed(Exception):
+    """The computation failed in another process; carries its error message"""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Coalesces identical in-flight calls between threads of one process"""
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self._counts = {"calls": 0, "coalesced": 0}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn() once per key at a time
+
+        Returns:
+            (result, shared) where shared is True if the result came from another caller's run
+        """
+        with self._lock:
+            self._counts["calls"] += 1
+            call = self._calls.get(key)
+            if call is not None:
+                self._counts["coalesced"] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value, False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self._counts, "inFlight": len(self._calls)}
+
+
+class SharedSingleFlight:
+    """
+    Coalesces identical calls across processes/nodes through a shared state backend
+
+    The first caller takes a lease key with state.add(); others poll for the
+    result key it publishes. If the lease expires without a result (the leader
+    died), a waiter takes over. Results must be JSON-serializable.
+    """
+
+    def __init__(self, state, local: Optional[SingleFlight] = None, lease: Optional[float] = None,
+                 poll_interval: float = 0.1, result_ttl: float = 30.0):
+        """
+        Args:
+            state: Shared key/value backend (see shared_state.create_state)
+            local: In-process layer, so threads of one process only send one caller to the store
+            lease: Seconds a leader may compute before others take over (SINGLEFLIGHT_LEASE, default 180)
+            poll_interval: Seconds between result checks while waiting
+            result_ttl: How long a published result stays available to late waiters
+        """
+        self.state = state
+        self.local = local or SingleFlight()
+        self.lease = lease or float(os.getenv("SINGLEFLIGHT_LEASE", "180"))
+        self.poll_interval = poll_interval
+        self.result_ttl = result_ttl
+        self._lock = threading.Lock()
+        self._remote_hits = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Same contract as SingleFlight.do"""
+        (value, remote), shared = self.local.do(key, lambda: self._do_shared(key, fn))
+        return value, shared or remote
+
+    def _do_shared(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        lease_key = f"flight:lease:{key}"
+        token = uuid.uuid4().hex
+        while True:
+            if self.state.add(lease_key, token, ttl=self.lease):
+                # Results are published per lease, so a later flight never picks up this one's
+                result_key = f"flight:result:{key}:{token}"
+                try:
+                    value = fn()
+                except Exception as e:
+                    self.state.set(result_key, {"error": str(e) or type(e).__name__}, ttl=self.result_ttl)
+                    raise
+                else:
+                    self.state.set(result_key, {"value": value}, ttl=self.result_ttl)
+                finally:
+                    self.state.delete(lease_key)
+                return value, False
+
+            # Someone else holds the lease: wait for their result or for the lease to lapse
+            leader = self.state.get(lease_key)
+            if leader is None:
+                continue
+            result_key = f"flight:result:{key}:{leader}"
+            while True:
+                result = self.state.get(result_key)
+                if result is None and self.state.get(lease_key) != leader:
+                    # The leader publishes before releasing, so look once more before taking over
+                    result = self.state.get(result_key)
+                    if result is None:
+                        break
+                if result is not None:
+                    with self._lock:
+                        self._remote_hits += 1
+                    if "error" in result:
+                        raise FlightFailed(result["error"])
+                    return result["value"], True
+                time.sleep(self.poll_interval)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self.local.stats(), "remoteCoalesced": self._remote_hits, "shared": True}
+
+
+def create_singleflight(state=None):
+    """Cross-process flights when state is shared (SHARED_STATE_URL), else in-process only; SINGLEFLIGHT_SHARED=0/1 overrides."""
+    override = os.getenv("SINGLEFLIGHT_SHARED")
+    shared = state is not None and not isinstance(state, MemoryState)
+    if override is not None:
+        shared = override == "1" and state is not None
+    return SharedSingleFlight(state) if shared else SingleFlight()
@@ -0,0 +1,401 @@
+"""
+Artifact storage for uploads, voice samples and generated audio
+Sharded on-disk layout, SQLite metadata index, quotas and background TTL/LRU cleanup
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+# Optional S3-compatible backend (AWS S3, MinIO, ...)
+try:
+    import boto3
+    BOTO3_AVAILABLE = True
+except ImportError:
+    BOTO3_AVAILABLE = False
+    boto3 = None
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_ROOT = os.path.join(APP_DIR, "uploads")
+
+# kind -> (TTL in seconds since last access, max total bytes before LRU eviction)
+DEFAULT_RETENTION = {
+    "images": (7 * 24 * 3600, 2 * 1024 ** 3),
+    "voices": (30 * 24 * 3600, 1 * 1024 ** 3),
+    "audio": (7 * 24 * 3600, 5 * 1024 ** 3),
+}
+
+# Only write last_access back to the index when it is older than this
+TOUCH_INTERVAL = 60.0
+
+
+class QuotaExceeded(Exception):
+    """Raised when storing an artifact would put its owner over quota."""
+
+
+def shard_path(kind: str, name: str) -> str:
+    """Relative sharded path: <kind>/<aa>/<bb>/<name>, with aa/bb from a hash of the name."""
+    digest = hashlib.sha1(name.encode("utf-8")).hexdigest()
+    return os.path.join(kind, digest[:2], digest[2:4], name)
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class LocalBackend:
+    """Artifacts stored under a local directory using the sharded layout"""
+
+    name = "local"
+
+    def __init__(self, root: str = DEFAULT_ROOT):
+        self.root = root
+
+    def path(self, kind: str, name: str) -> str:
+        return os.path.join(self.root, shard_path(kind, name))
+
+    def staging_path(self, kind: str, name: str) -> str:
+        """Where callers should write a new artifact (the final location for local storage)."""
+        path = self.path(kind, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def put_file(self, kind: str, name: str, src_path: str):
+        dest = self.staging_path(kind, name)
+        if os.path.abspath(src_path) != os.path.abspath(dest):
+            os.replace(src_path, dest)
+
+    def local_path(self, kind: str, name: str) -> Optional[str]:
+        path = self.path(kind, name)
+        return path if os.path.exists(path) else None
+
+    def delete(self, kind: str, name: str):
+        try:
+            os.remove(self.path(kind, name))
+        except FileNotFoundError:
+            pass
+
+
+class S3Backend:
+    """
+    Artifacts stored in an S3-compatible bucket (set endpoint_url for MinIO)
+    Reads are served from a local cache directory that uses the same sharded layout.
+    """
+
+    name = "s3"
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, prefix: str = "",
+                 cache_dir: str = os.path.join(DEFAULT_ROOT, ".s3cache")):
+        if not BOTO3_AVAILABLE:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires the boto3 package")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.cache = LocalBackend(cache_dir)
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+
+    def _key(self, kind: str, name: str) -> str:
+        key = shard_path(kind, name).replace(os.sep, "/")
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def staging_path(self, kind: str, name: str) -> str:
+        return self.cache.staging_path(kind, name)
+
+    def put_file(self, kind: str, name: str, src_path: str):
+        self.client.upload_file(src_path, self.bucket, self._key(kind, name))
+        # Keep the written file as the read cache for this node
+        self.cache.put_file(kind, name, src_path)
+
+    def local_path(self, kind: str, name: str) -> Optional[str]:
+        path = self.cache.local_path(kind, name)
+        if path:
+            return path
+        dest = self.cache.staging_path(kind, name)
+        tmp = f"{dest}.part"
+        try:
+            self.client.download_file(self.bucket, self._key(kind, name), tmp)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return None
+        os.replace(tmp, dest)
+        return dest
+
+    def delete(self, kind: str, name: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(kind, name))
+        self.cache.delete(kind, name)
+
+
+class ArtifactIndex:
+    """SQLite metadata index of every stored artifact"""
+
+    SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    ref TEXT,
+    size INTEGER NOT NULL,
+    owner TEXT,
+    sha256 TEXT,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (kind, name)
+);
+CREATE INDEX IF NOT EXISTS artifacts_ref ON artifacts (kind, ref);
+CREATE INDEX IF NOT EXISTS artifacts_lru ON artifacts (kind, last_access);
+CREATE INDEX IF NOT EXISTS artifacts_owner ON artifacts (owner);
+"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def upsert(self, kind: str, name: str, size: int, owner: Optional[str], sha256: Optional[str],
+               ref: Optional[str] = None):
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            """INSERT INTO artifacts (kind, name, ref, size, owner, sha256, created_at, last_access)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT (kind, name) DO UPDATE SET
+                 ref = excluded.ref, size = excluded.size, owner = excluded.owner,
+                 sha256 = excluded.sha256, last_access = excluded.last_access""",
+            (kind, name, ref, size, owner, sha256, now, now),
+        )
+        conn.commit()
+
+    def get(self, kind: str, name: str) -> Optional[Dict]:
+        row = self._conn().execute("SELECT * FROM artifacts WHERE kind = ? AND name = ?", (kind, name)).fetchone()
+        return dict(row) if row else None
+
+    def find_by_ref(self, kind: str, ref: str) -> Optional[Dict]:
+        row = self._conn().execute(
+            "SELECT * FROM artifacts WHERE kind = ? AND ref = ? ORDER BY created_at DESC LIMIT 1", (kind, ref)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def touch(self, kind: str, name: str, when: float):
+        conn = self._conn()
+        conn.execute("UPDATE artifacts SET last_access = ? WHERE kind = ? AND name = ?", (when, kind, name))
+        conn.commit()
+
+    def delete(self, kind: str, name: str):
+        conn = self._conn()
+        conn.execute("DELETE FROM artifacts WHERE kind = ? AND name = ?", (kind, name))
+        conn.commit()
+
+    def owner_usage(self, owner: str) -> int:
+        row = self._conn().execute("SELECT COALESCE(SUM(size), 0) FROM artifacts WHERE owner = ?", (owner,)).fetchone()
+        return int(row[0])
+
+    def kind_usage(self) -> Dict[str, Dict[str, int]]:
+        rows = self._conn().execute("SELECT kind, COUNT(*), COALESCE(SUM(size), 0) FROM artifacts GROUP BY kind")
+        return {kind: {"count": count, "bytes": total} for kind, count, total in rows}
+
+    def expired(self, kind: str, cutoff: float, limit: int = 500) -> List[Dict]:
+        rows = self._conn().execute(
+            "SELECT kind, name, size FROM artifacts WHERE kind = ? AND last_access < ? ORDER BY last_access LIMIT ?",
+            (kind, cutoff, limit),
+        )
+        return [dict(r) for r in rows]
+
+    def least_recent(self, kind: str, limit: int = 500) -> List[Dict]:
+        rows = self._conn().execute(
+            "SELECT kind, name, size FROM artifacts WHERE kind = ? ORDER BY last_access LIMIT ?", (kind, limit)
+        )
+        return [dict(r) for r in rows]
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def create_backend():
+    if os.getenv("STORAGE_BACKEND", "local").lower() == "s3":
+        return S3Backend(
+            bucket=os.getenv("S3_BUCKET", "replae"),
+            endpoint_url=os.getenv("S3_ENDPOINT_URL") or None,
+            prefix=os.getenv("S3_PREFIX", ""),
+        )
+    return LocalBackend(os.getenv("STORAGE_ROOT", DEFAULT_ROOT))
+
+
+class ArtifactStore:
+    def __init__(self, backend=None, index: Optional[ArtifactIndex] = None, legacy_root: str = DEFAULT_ROOT):
+        """
+        Initialize the artifact store
+
+        Retention and quotas come from env vars (sizes in MB, TTLs in hours):
+        STORAGE_OWNER_QUOTA_MB, STORAGE_<KIND>_MAX_MB, STORAGE_<KIND>_TTL_HOURS, STORAGE_GC_INTERVAL.
+
+        Args:
+            backend: LocalBackend or S3Backend (picked from STORAGE_BACKEND if omitted)
+            index: Metadata index (defaults to STORAGE_INDEX_PATH or uploads/artifacts.sqlite3)
+            legacy_root: Folder with the old flat uploads/<kind>/<name> layout, still readable
+        """
+        self.backend = backend or create_backend()
+        self.index = index or ArtifactIndex(os.getenv("STORAGE_INDEX_PATH", os.path.join(DEFAULT_ROOT, "artifacts.sqlite3")))
+        self.legacy_root = legacy_root
+        self.owner_quota = int(_env_float("STORAGE_OWNER_QUOTA_MB", 500) * 1024 ** 2)
+        self.retention = {}
+        for kind, (ttl, max_bytes) in DEFAULT_RETENTION.items():
+            self.retention[kind] = (
+                _env_float(f"STORAGE_{kind.upper()}_TTL_HOURS", ttl / 3600) * 3600,
+                int(_env_float(f"STORAGE_{kind.upper()}_MAX_MB", max_bytes / 1024 ** 2) * 1024 ** 2),
+            )
+        self.gc_interval = _env_float("STORAGE_GC_INTERVAL", 600)
+        self._gc_thread = None
+        self._gc_stop = threading.Event()
+        self._delete_listeners = []
+
+    def check_quota(self, owner: Optional[str], incoming_bytes: int):
+        """Raise QuotaExceeded if `owner` can't store `incoming_bytes` more."""
+        if not owner or self.owner_quota <= 0:
+            return
+        used = self.index.owner_usage(owner)
+        if used + max(0, incoming_bytes) > self.owner_quota:
+            raise QuotaExceeded(
+                f"Storage quota exceeded ({used // 1024 ** 2} MB used of {self.owner_quota // 1024 ** 2} MB)"
+            )
+
+    def new_path(self, kind: str, name: str) -> str:
+        """Local path to write a new artifact to before calling commit()."""
+        return self.backend.staging_path(kind, name)
+
+    def commit(self, kind: str, name: str, src_path: str, owner: Optional[str] = None,
+               ref: Optional[str] = None) -> Dict:
+        """Move a written file into storage and record it in the index."""
+        size = os.path.getsize(src_path)
+        sha256 = file_sha256(src_path)
+        self.backend.put_file(kind, name, src_path)
+        self.index.upsert(kind, name, size, owner, sha256, ref)
+        return {"kind": kind, "name": name, "size": size, "sha256": sha256, "owner": owner, "ref": ref}
+
+    def open_path(self, kind: str, name: str) -> Optional[str]:
+        """Local path of a stored artifact (None if unknown), recording the access for LRU."""
+        record = self.index.get(kind, name)
+        if record:
+            path = self.backend.local_path(kind, name)
+            if path:
+                now = time.time()
+                if now - record["last_access"] > TOUCH_INTERVAL:
+                    self.index.touch(kind, name, now)
+                return path
+            # File vanished underneath the index
+            self.index.delete(kind, name)
+            return None
+        # Files written before the index existed live in the flat legacy layout
+        legacy = os.path.join(self.legacy_root, kind, name)
+        return legacy if os.path.isfile(legacy) else None
+
+    def find_by_ref(self, kind: str, ref: str) -> Optional[Dict]:
+        record = self.index.find_by_ref(kind, ref)
+        if record:
+            return record
+        # Legacy voices were saved as <voice_id>_<filename> in a flat folder
+        legacy_dir = os.path.join(self.legacy_root, kind)
+        if os.path.isdir(legacy_dir):
+            with os.scandir(legacy_dir) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.name.startswith(ref):
+                        return {"kind": kind, "name": entry.name, "ref": ref}
+        return None
+
+    def on_delete(self, listener: Callable[[str, str, Optional[str]], None]):
+        """Call listener(kind, name, ref) whenever an artifact is deleted, including by GC."""
+        self._delete_listeners.append(listener)
+
+    def delete(self, kind: str, name: str):
+        record = self.index.get(kind, name)
+        self.backend.delete(kind, name)
+        self.index.delete(kind, name)
+        for listener in self._delete_listeners:
+            try:
+                listener(kind, name, record.get("ref") if record else None)
+            except Exception as e:
+                print(f"Storage delete listener error: {e}")
+
+    def collect_garbage(self) -> Dict[str, int]:
+        """Delete artifacts past their TTL, then evict least-recently-used ones over each kind's size cap."""
+        removed = {"expired": 0, "evicted": 0, "bytes": 0}
+        now = time.time()
+        for kind, (ttl, max_bytes) in self.retention.items():
+            if ttl > 0:
+                while True:
+                    batch = self.index.expired(kind, now - ttl)
+                    for item in batch:
+                        self.delete(kind, item["name"])
+                        removed["expired"] += 1
+                        removed["bytes"] += item["size"]
+                    if len(batch) < 500:
+                        break
+            if max_bytes > 0:
+                used = self.index.kind_usage().get(kind, {}).get("bytes", 0)
+                while used > max_bytes:
+                    batch = self.index.least_recent(kind)
+                    if not batch:
+                        break
+                    for item in batch:
+                        if used <= max_bytes:
+                            break
+                        self.delete(kind, item["name"])
+                        used -= item["size"]
+                        removed["evicted"] += 1
+                        removed["bytes"] += item["size"]
+        return removed
+
+    def _gc_loop(self):
+        while not self._gc_stop.wait(self.gc_interval):
+            try:
+                removed = self.collect_garbage()
+                if removed["expired"] or removed["evicted"]:
+                    print(f"Storage GC: {removed}")
+            except Exception as e:
+                print(f"Storage GC error: {e}")
+
+    def start_gc(self):
+        """Start the background cleanup thread (no-op if already running or disabled)."""
+        if self.gc_interval <= 0 or (self._gc_thread and self._gc_thread.is_alive()):
+            return
+        self._gc_stop.clear()
+        self._gc_thread = threading.Thread(target=self._gc_loop, name="storage-gc", daemon=True)
+        self._gc_thread.start()
+
+    def stop_gc(self):
+        self._gc_stop.set()
+
+    def stats(self) -> Dict:
+        return {"backend": self.backend.name, "kinds": self.index.kind_usage()}
+
+
+# Global instance
+_store = None
+
+def get_store() -> ArtifactStore:
+    """Get or create global artifact store"""
+    global _store
+    if _store is None:
+        _store = ArtifactStore()
+    return _store
@@ -2,12 +2,16 @@
 TTS Service using Fish Audio
 Handles text-to-speech generation with custom voice support
 """
+import mimetypes
 import os
+import threading
 import uuid
 from pathlib import Path
 from typing import Optional
 import requests
 
+from local_tts import get_local_tts
+
 # Try to import Fish Audio SDK
 try:
     from fishaudio import FishAudio
@@ -19,17 +23,19 @@ except ImportError:
     ReferenceAudio = None
 
 class TTSService:
-    def __init__(self, api_key: Optional[str] = None, base_url: str = "https://api.fish.audio"):
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None):
         """
         Initialize TTS Service
         
         Args:
             api_key: Fish Audio API key (optional, can be set via env var FISH_AUDIO_API_KEY)
-            base_url: Fish Audio API base URL
+            base_url: Fish Audio API base URL (optional, can be set via env var FISH_AUDIO_BASE_URL)
         """
         self.api_key = api_key or os.getenv("FISH_AUDIO_API_KEY")
-        self.base_url = base_url.rstrip('/')
+        self.base_url = (base_url or os.getenv("FISH_AUDIO_BASE_URL", "https://api.fish.audio")).rstrip('/')
         self.sdk_client = None
+        # Which backend produced the current thread's last audio ("fish" or "local")
+        self._last = threading.local()
         
         # Try to initialize SDK if available
         if FISH_SDK_AVAILABLE and self.api_key and FishAudio:
@@ -57,7 +63,14 @@ class TTSService:
         Returns:
             Path to generated audio file, or None if generation failed
         """
+        # A stock voice can come from the local engine; a cloned voice can't
+        can_fall_back = use_default_voice and not voice_file_path
+        self._last.backend = "fish"
         if not self.api_key:
+            if can_fall_back:
+                fallback = self._fallback_tts(text, output_path)
+                if fallback:
+                    return fallback
             raise Exception("FISH_AUDIO_API_KEY is not set. Please configure your API key in the .env file.")
         
         try:
@@ -129,8 +142,9 @@ class TTSService:
                     for field_name in field_names_to_try:
                         try:
                             with open(voice_file_path, 'rb') as f:
+                                mime_type = mimetypes.guess_type(voice_file_path)[0] or 'audio/mpeg'
                                 files = {
-                                    field_name: (os.path.basename(voice_file_path), f, 'audio/mpeg')
+                                    field_name: (os.path.basename(voice_file_path), f, mime_type)
                                 }
                                 data = {
                                     'text': text,
@@ -195,12 +209,36 @@ class TTSService:
             error_msg = str(e)
             print(f"TTS Service error: {error_msg}")
             print(f"Traceback:\n{traceback.format_exc()}")
+            if can_fall_back:
+                fallback = self._fallback_tts(text, output_path)
+                if fallback:
+                    print(f"Used local TTS fallback: {fallback}")
+                    return fallback
             # Re-raise the exception so it can be caught by the caller
             raise
     
     def _fallback_tts(self, text: str, output_path: Optional[str] = None) -> Optional[str]:
-        """Fallback TTS using system TTS (platform-dependent)"""
-        return None
+        """Fallback TTS using the local CPU engine (Piper or espeak-ng); None if none is installed"""
+        local = get_local_tts()
+        if not local.available:
+            return None
+        if not output_path:
+            APP_DIR = os.path.dirname(os.path.abspath(__file__))
+            AUDIO_FOLDER = os.path.join(APP_DIR, "uploads", "audio")
+            os.makedirs(AUDIO_FOLDER, exist_ok=True)
+            output_path = os.path.join(AUDIO_FOLDER, f"tts_{uuid.uuid4().hex[:8]}.wav")
+        try:
+            result = local.synthesize(text, output_path)
+            if result:
+                self._last.backend = "local"
+            return result
+        except Exception as e:
+            print(f"Local TTS failed: {e}")
+            return None
+
+    def last_backend(self) -> str:
+        """Backend ("fish" or "local") that served this thread's last generate_audio call"""
+        return getattr(self._last, "backend", "fish")
 
 # Global instance
 _tts_service = None
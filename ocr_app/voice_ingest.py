@@ -0,0 +1,235 @@
+"""
+Voice sample ingestion
+Turns an uploaded voice sample (any length, format or sample rate) into a short,
+clean, loudness-normalized reference clip once at upload, instead of sending the
+whole file to the TTS provider with every cloning request.
+"""
+import hashlib
+import io
+import os
+import shutil
+import subprocess
+import wave
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+FRAME_MS = 30
+# Pauses longer than this are shortened to it
+MAX_PAUSE_MS = 400
+TARGET_RMS_DBFS = -20.0
+PEAK_CEILING_DBFS = -1.0
+# Samples at or above this fraction of full scale count as clipped
+CLIP_LEVEL = 0.99
+
+
+class VoiceIngestError(Exception):
+    """The sample couldn't be decoded or contains no usable speech"""
+
+
+class UnsupportedFormat(VoiceIngestError):
+    """Decoding this format needs ffmpeg, which isn't installed"""
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def find_ffmpeg() -> Optional[str]:
+    return os.getenv("FFMPEG_BIN") or shutil.which("ffmpeg")
+
+
+def _decode_wav(data: bytes) -> Tuple[np.ndarray, int]:
+    with wave.open(io.BytesIO(data), "rb") as w:
+        channels, width, rate = w.getnchannels(), w.getsampwidth(), w.getframerate()
+        raw = w.readframes(w.getnframes())
+    if width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 3:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+        ints = np.where(ints >= 1 << 23, ints - (1 << 24), ints)
+        samples = ints.astype(np.float32) / float(1 << 23)
+    elif width == 4:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / float(1 << 31)
+    else:
+        raise VoiceIngestError(f"Unsupported WAV sample width: {width} bytes")
+    if channels > 1:
+        samples = samples[: len(samples) // channels * channels].reshape(-1, channels).mean(axis=1)
+    return samples, rate
+
+
+def decode_audio(data: bytes, target_rate: int) -> Tuple[np.ndarray, int]:
+    """
+    Decode audio bytes to mono float32 in [-1, 1]
+
+    PCM WAV is read directly; anything else (MP3, OGG, ...) goes through ffmpeg,
+    which also resamples to target_rate on the way.
+    """
+    if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+        try:
+            return _decode_wav(data)
+        except (wave.Error, EOFError):
+            pass  # Compressed WAV (e.g. A-law): let ffmpeg try
+    ffmpeg = find_ffmpeg()
+    if not ffmpeg:
+        raise UnsupportedFormat("ffmpeg is required to decode this audio format")
+    result = subprocess.run(
+        [ffmpeg, "-nostdin", "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+         "-ac", "1", "-ar", str(target_rate), "-f", "s16le", "pipe:1"],
+        input=data, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=120,
+    )
+    if result.returncode != 0 or not result.stdout:
+        raise VoiceIngestError(f"Could not decode audio: {result.stderr.decode('utf-8', 'replace')[:200]}")
+    return np.frombuffer(result.stdout, dtype="<i2").astype(np.float32) / 32768.0, target_rate
+
+
+def resample(samples: np.ndarray, rate: int, target_rate: int) -> np.ndarray:
+    """Band-limited linear-interpolation resampler (windowed-sinc low-pass first when downsampling)."""
+    if rate == target_rate or len(samples) == 0:
+        return samples
+    if target_rate < rate:
+        cutoff = 0.5 * target_rate / rate * 0.9
+        taps = np.arange(-32, 33)
+        kernel = 2 * cutoff * np.sinc(2 * cutoff * taps) * np.hamming(len(taps))
+        samples = np.convolve(samples, (kernel / kernel.sum()).astype(np.float32), mode="same")
+    duration = len(samples) / rate
+    out_len = int(round(duration * target_rate))
+    positions = np.arange(out_len, dtype=np.float64) * (rate / target_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def frame_levels(samples: np.ndarray, frame: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-frame RMS level in dBFS and clipped-sample fraction."""
+    n = len(samples) // frame
+    frames = samples[: n * frame].reshape(n, frame)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1) + 1e-12)
+    clipped = np.mean(np.abs(frames) >= CLIP_LEVEL, axis=1)
+    return 20 * np.log10(rms), clipped
+
+
+def speech_mask(levels_db: np.ndarray) -> np.ndarray:
+    """Frames loud enough to be speech, relative to the recording's own noise floor."""
+    noise_floor = np.percentile(levels_db, 10)
+    peak = np.percentile(levels_db, 95)
+    threshold = max(noise_floor + 10.0, peak - 40.0, -60.0)
+    return levels_db > threshold
+
+
+def kept_frames(voiced: np.ndarray, max_pause_frames: int) -> np.ndarray:
+    """Indices of frames to keep: leading/trailing silence dropped, long pauses shortened."""
+    idx = np.flatnonzero(voiced)
+    if len(idx) == 0:
+        return idx
+    keep = np.zeros(len(voiced), dtype=bool)
+    run = 0
+    for i in range(idx[0], idx[-1] + 1):
+        run = 0 if voiced[i] else run + 1
+        keep[i] = run <= max_pause_frames
+    return np.flatnonzero(keep)
+
+
+def best_window(voiced: np.ndarray, clipped: np.ndarray, window: int) -> int:
+    """Start frame of the window with the most clean speech (voiced, unclipped frames)."""
+    if len(voiced) <= window:
+        return 0
+    score = voiced.astype(np.float64) - 4.0 * clipped
+    sums = np.convolve(score, np.ones(window), mode="valid")
+    return int(np.argmax(sums))
+
+
+def normalize_loudness(samples: np.ndarray, voiced: np.ndarray, frame: int) -> np.ndarray:
+    """Scale so voiced frames sit at TARGET_RMS_DBFS, without pushing peaks past PEAK_CEILING_DBFS."""
+    frames = samples[: len(voiced) * frame].reshape(len(voiced), frame)
+    speech = frames[voiced] if voiced.any() else frames
+    rms = float(np.sqrt(np.mean(speech ** 2) + 1e-12))
+    gain = 10 ** (TARGET_RMS_DBFS / 20) / rms
+    peak = float(np.max(np.abs(samples))) or 1.0
+    gain = min(gain, 10 ** (PEAK_CEILING_DBFS / 20) / peak)
+    return np.clip(samples * gain, -1.0, 1.0)
+
+
+def encode_wav(samples: np.ndarray, rate: int) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes((samples * 32767.0).astype("<i2").tobytes())
+    return buf.getvalue()
+
+
+def encode_mp3(samples: np.ndarray, rate: int, bitrate: str = "64k") -> bytes:
+    result = subprocess.run(
+        [find_ffmpeg(), "-nostdin", "-hide_banner", "-loglevel", "error",
+         "-f", "s16le", "-ac", "1", "-ar", str(rate), "-i", "pipe:0", "-b:a", bitrate, "-f", "mp3", "pipe:1"],
+        input=(samples * 32767.0).astype("<i2").tobytes(), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        timeout=120,
+    )
+    if result.returncode != 0:
+        raise VoiceIngestError(f"Could not encode reference: {result.stderr.decode('utf-8', 'replace')[:200]}")
+    return result.stdout
+
+
+def ingest_voice(data: bytes, sample_rate: Optional[int] = None, max_seconds: Optional[float] = None,
+                 min_seconds: Optional[float] = None, fmt: Optional[str] = None) -> Dict:
+    """
+    Build a normalized reference clip from an uploaded sample
+
+    Args:
+        data: Uploaded file bytes
+        sample_rate: Output rate (VOICE_SAMPLE_RATE, default 24000)
+        max_seconds: Length of the selected speech window (VOICE_REFERENCE_SECONDS, default 15)
+        min_seconds: Less clean speech than this is rejected (VOICE_MIN_SECONDS, default 3)
+        fmt: "mp3" or "wav" (VOICE_REFERENCE_FORMAT, default mp3; wav when ffmpeg is missing)
+
+    Returns:
+        {"data": encoded bytes, "format", "sha256", "sampleRate", "durationSec", "inputDurationSec"}
+    """
+    sample_rate = sample_rate or int(_env_float("VOICE_SAMPLE_RATE", 24000))
+    max_seconds = max_seconds or _env_float("VOICE_REFERENCE_SECONDS", 15)
+    min_seconds = min_seconds if min_seconds is not None else _env_float("VOICE_MIN_SECONDS", 3)
+    fmt = (fmt or os.getenv("VOICE_REFERENCE_FORMAT") or "mp3").lower()
+    if fmt == "mp3" and not find_ffmpeg():
+        fmt = "wav"
+
+    samples, rate = decode_audio(data, sample_rate)
+    input_duration = len(samples) / rate if rate else 0.0
+    frame = sample_rate * FRAME_MS // 1000
+    if len(samples) * sample_rate < frame * rate:
+        raise VoiceIngestError("Voice sample is empty")
+    # Remove any DC offset before measuring levels
+    samples = resample(samples - float(np.mean(samples)), rate, sample_rate)
+
+    levels, clipped = frame_levels(samples, frame)
+    voiced = speech_mask(levels)
+    keep = kept_frames(voiced, MAX_PAUSE_MS // FRAME_MS)
+    frames = samples[: len(voiced) * frame].reshape(len(voiced), frame)[keep]
+    voiced, clipped = voiced[keep], clipped[keep]
+
+    window = int(max_seconds * 1000 // FRAME_MS)
+    start = best_window(voiced, clipped, window)
+    voiced = voiced[start: start + window]
+    samples = frames[start: start + window].ravel()
+
+    speech_seconds = voiced.sum() * FRAME_MS / 1000.0
+    if speech_seconds < min_seconds:
+        raise VoiceIngestError(
+            f"Voice sample has only {speech_seconds:.1f}s of clear speech (need at least {min_seconds:g}s)"
+        )
+
+    samples = normalize_loudness(samples, voiced, frame)
+    encoded = encode_mp3(samples, sample_rate) if fmt == "mp3" else encode_wav(samples, sample_rate)
+    return {
+        "data": encoded,
+        "format": "mp3" if fmt == "mp3" else "wav",
+        "sha256": hashlib.sha256(encoded).hexdigest(),
+        "sampleRate": sample_rate,
+        "durationSec": round(len(samples) / sample_rate, 2),
+        "inputDurationSec": round(input_duration, 2),
+    }
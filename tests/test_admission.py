@@ -0,0 +1,38 @@
+import threading
+import time
+
+from admission import FairScheduler
+
+
+def test_fair_scheduler_alternates_between_flows():
+    scheduler = FairScheduler("test", max_concurrency=1)
+    assert scheduler.acquire("holder")
+    order = []
+
+    def worker(flow):
+        assert scheduler.acquire(flow, timeout=5)
+        order.append(flow)
+        scheduler.release()
+
+    # A busy client queues three requests before a second client queues one
+    threads = []
+    for flow in ["busy", "busy", "busy", "other"]:
+        t = threading.Thread(target=worker, args=(flow,))
+        t.start()
+        threads.append(t)
+        time.sleep(0.05)
+    scheduler.release()
+    for t in threads:
+        t.join()
+
+    assert order.index("other") <= 1
+    assert order.count("busy") == 3
+
+
+def test_fair_scheduler_times_out_when_full():
+    scheduler = FairScheduler("test", max_concurrency=1)
+    assert scheduler.acquire("a")
+    assert not scheduler.acquire("b", timeout=0.05)
+    assert scheduler.rejected == 1
+    scheduler.release()
+    assert scheduler.acquire("b", timeout=0.05)
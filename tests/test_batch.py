@@ -0,0 +1,56 @@
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.mock_providers import MockProviderServer
+
+
+def write_page(path, lines):
+    img = np.full((1200, 900, 3), 235, np.uint8)
+    for i, line in enumerate(lines):
+        cv2.putText(img, line, (60, 150 + i * 90), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (30, 30, 30), 2, cv2.LINE_AA)
+    cv2.imwrite(str(path), img)
+
+
+@pytest.fixture
+def mock_env(tmp_path, monkeypatch):
+    """Provider mocks plus storage under tmp_path, set before the app module is first imported."""
+    with MockProviderServer() as mock:
+        for name, value in mock.env().items():
+            monkeypatch.setenv(name, value)
+        monkeypatch.setenv("STORAGE_ROOT", str(tmp_path / "storage"))
+        monkeypatch.setenv("STORAGE_INDEX_PATH", str(tmp_path / "storage" / "artifacts.sqlite3"))
+        monkeypatch.setenv("SEARCH_INDEX_PATH", str(tmp_path / "search.sqlite3"))
+        monkeypatch.setenv("STORAGE_GC_INTERVAL", "0")
+        yield mock
+
+
+def test_batch_runs_full_pipeline_with_tts(mock_env, tmp_path):
+    from batch import BatchRunner, load_checkpoint
+
+    images = tmp_path / "images"
+    images.mkdir()
+    write_page(images / "page1.png", ["Shopping list", "milk and eggs", "coffee beans"])
+    write_page(images / "page2.png", ["Lab report", "enzymes at 37C", "repeat on Friday"])
+    cv2.imwrite(str(images / "blank.png"), np.full((1200, 900, 3), 235, np.uint8))
+
+    summary = BatchRunner(str(images), workers=2, tts=True).run()
+
+    assert summary["statuses"] == {"ok": 2, "rejected": 1}
+    results = load_checkpoint(str(images / "batch_output" / "results.jsonl"))
+    for name in ("page1.png", "page2.png"):
+        record = results[name]
+        assert record["text"] and record["script"]
+        assert os.path.getsize(images / "batch_output" / record["audio"]) > 0
+        assert set(record["timingsMs"]) >= {"ocr", "enhance", "tts"}
+    assert mock_env.counts["/v1/tts"] == 2
+
+    # Rerunning resumes from the checkpoint instead of calling the providers again
+    again = BatchRunner(str(images), workers=2, tts=True).run()
+    assert again["skipped"] == 3 and again["processed"] == 0
+    assert mock_env.counts["/v1/tts"] == 2
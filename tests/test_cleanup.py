@@ -0,0 +1,102 @@
+import re
+
+import cleanup
+from cleanup import BATCH_CHAR_BUDGET, find_spans, line_confidence, selective_cleanup
+
+WORDS = {"the", "meeting", "is", "on", "monday", "bring", "notes", "and", "a", "pen",
+         "call", "bob", "about", "budget", "buy", "milk", "eggs", "time", "to", "go"}
+
+
+class FakeSpell:
+    def known(self, words):
+        return {w for w in words if w in WORDS}
+
+
+SPELL = FakeSpell()
+
+
+class FakeRepair:
+    """Records calls and answers each <fix id="N"> with a reply built by `fix(id, text)`."""
+
+    def __init__(self, fix=lambda span_id, text: text.upper()):
+        self.fix = fix
+        self.calls = []
+
+    def __call__(self, system_prompt, content, max_tokens):
+        self.calls.append(content)
+        replies = []
+        for m in re.finditer(r'<fix id="(\d+)">(.*?)</fix>', content, re.DOTALL):
+            text = self.fix(int(m.group(1)), m.group(2))
+            if text is not None:
+                replies.append(f'<fix id="{m.group(1)}">{text}</fix>')
+        return "\n".join(replies)
+
+
+def test_clean_page_makes_no_calls():
+    text = "The meeting is on Monday\nBring notes and a pen\n\nCall Bob about the budget"
+    repair = FakeRepair()
+    cleaned, stats = selective_cleanup(text, repair, SPELL)
+    assert cleaned == text
+    assert repair.calls == [] and stats["calls"] == 0
+
+
+def test_garbled_lines_score_low():
+    assert line_confidence("Buy milk and eggs", SPELL) == 1.0
+    assert line_confidence("c@ll B0b ab0ut +he budg3t", SPELL) < 0.5
+    assert line_confidence("", SPELL) == 1.0
+
+
+def test_consecutive_low_lines_form_one_span():
+    lines = ["ok", "bad", "bad", "ok", "bad", ""]
+    scores = [1.0, 0.1, 0.2, 1.0, 0.3, 0.0]
+    assert find_spans(lines, scores, 0.9) == [(1, 3), (4, 5)]
+
+
+def test_only_low_confidence_spans_are_sent_and_spliced_in_order():
+    lines = ["The meeting is on Monday", "c@ll B0b", "Bring notes and a pen", "t1me t0 g0", "Buy milk"]
+    repair = FakeRepair(lambda span_id, text: f"fixed {span_id}")
+    cleaned, stats = selective_cleanup("\n".join(lines), repair, SPELL)
+
+    assert len(repair.calls) == 1
+    assert cleaned.split("\n") == ["The meeting is on Monday", "fixed 1", "Bring notes and a pen", "fixed 2", "Buy milk"]
+    assert stats["spans"] == 2 and stats["lowConfidenceLines"] == 2
+
+
+def test_spans_are_batched_under_budget():
+    # Clean separator lines keep each garbled line its own span
+    lines = []
+    for i in range(60):
+        lines += [f"g4rb4g3 l1n3 {i} " + "x#" * 40, "Buy milk"]
+    repair = FakeRepair()
+    _, stats = selective_cleanup("\n".join(lines), repair, SPELL)
+
+    assert stats["spans"] == 60
+    assert stats["calls"] == len(repair.calls) > 1
+    for content in repair.calls:
+        # Blocks are joined with blank lines; only the blocks count against the budget
+        assert len(content) - 2 * (content.count("<span ") - 1) <= BATCH_CHAR_BUDGET
+    sent = [int(i) for content in repair.calls for i in re.findall(r'<fix id="(\d+)">', content)]
+    assert sent == list(range(1, 61))
+
+
+def test_missing_or_partial_fixes_keep_raw_lines():
+    lines = ["c@ll B0b", "Buy milk", "t1me t0 g0", "Buy milk", "3gg$ + m1lk"]
+    text = "\n".join(lines)
+
+    cleaned, _ = selective_cleanup(text, FakeRepair(lambda span_id, t: "fixed" if span_id == 2 else None), SPELL)
+    assert cleaned.split("\n") == ["c@ll B0b", "Buy milk", "fixed", "Buy milk", "3gg$ + m1lk"]
+
+    # Unparseable reply, empty reply and a failed call all leave the text alone
+    for reply in ('<fix id="1">unterminated', "", None):
+        cleaned, _ = selective_cleanup(text, lambda *args: reply, SPELL)
+        assert cleaned == text
+
+
+def test_fix_for_an_id_outside_the_call_is_ignored(monkeypatch):
+    monkeypatch.setattr(cleanup, "BATCH_CHAR_BUDGET", 1)  # one span per call
+    text = "c@ll B0b\nBuy milk\nt1me t0 g0"
+    replies = iter(['<fix id="1">Call Bob</fix>', '<fix id="1">wrong span</fix>'])
+    # The second call only asked about span 2 but answers for span 1
+    cleaned, stats = selective_cleanup(text, lambda *args: next(replies), SPELL)
+    assert stats["calls"] == 2
+    assert cleaned == "Call Bob\nBuy milk\nt1me t0 g0"
@@ -0,0 +1,92 @@
+import time
+
+import cv2
+import numpy as np
+
+from incremental import PageHistory, changed_regions, reocr, text_line_bands
+from shared_state import Cluster, MemoryState
+from storage import ArtifactIndex, ArtifactStore, LocalBackend
+
+LINES = ["Shopping list for the week", "milk and eggs", "apples, pears, bananas",
+         "coffee beans 500g", "call the plumber on Tuesday", "return library books"]
+
+
+def photo(lines, shift=(0, 0), angle=0.0, gain=1.0):
+    img = np.full((1600, 1200, 3), 230, np.uint8)
+    for i, line in enumerate(lines):
+        cv2.putText(img, line, (90, 160 + i * 120), cv2.FONT_HERSHEY_SCRIPT_SIMPLEX, 1.8, (50, 40, 30), 2, cv2.LINE_AA)
+    M = cv2.getRotationMatrix2D((600, 800), angle, 1.0)
+    M[:, 2] += shift
+    img = cv2.warpAffine(img, M, (1200, 1600), borderValue=(230, 230, 230))
+    img = np.clip(img.astype(np.float32) * gain, 0, 255).astype(np.uint8)
+    return cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+
+def run(new_lines):
+    calls = []
+
+    def transcribe(image):
+        calls.append(image)
+        return "NEW"
+
+    result = reocr(photo(LINES), "\n".join(LINES), photo(new_lines, (8, -6), 1.0, 0.92), transcribe)
+    return result, calls
+
+
+def test_reshot_unchanged_page_needs_no_ocr():
+    result, calls = run(LINES)
+    assert result["regions"] == 0 and not calls
+    assert result["text"] == "\n".join(LINES)
+
+
+def test_word_rewritten_in_place_is_reocrd():
+    edited = list(LINES)
+    edited[1] = "milk and bread"
+    result, calls = run(edited)
+    assert len(calls) == 1
+    assert result["text"].split("\n") == [LINES[0], "NEW"] + LINES[2:]
+
+
+def test_added_line_is_inserted():
+    result, calls = run(LINES + ["buy stamps"])
+    assert len(calls) == 1
+    assert result["text"].split("\n") == LINES + ["NEW"]
+
+
+def test_descenders_stay_with_their_line():
+    gray = cv2.imdecode(np.frombuffer(photo(LINES), np.uint8), cv2.IMREAD_GRAYSCALE)
+    assert len(text_line_bands(gray)) == len(LINES)
+
+
+def test_identical_images_have_no_changed_regions():
+    gray = cv2.imdecode(np.frombuffer(photo(LINES), np.uint8), cv2.IMREAD_GRAYSCALE)
+    assert changed_regions(gray, gray, np.full(gray.shape, 255, np.uint8)) == []
+
+
+def test_page_history_is_per_owner(tmp_path):
+    store = ArtifactStore(LocalBackend(str(tmp_path / "files")), ArtifactIndex(str(tmp_path / "index.sqlite3")))
+    pages = PageHistory(Cluster(MemoryState(), node_id="a"), store)
+    pages.save("page-1", b"alice's photo", "alice's notes", owner="ip:1.1.1.1")
+
+    assert pages.latest("page-1", owner="ip:2.2.2.2") is None
+    assert pages.save("page-1", b"mallory's photo", "mallory's notes", owner="ip:2.2.2.2") == 1
+    assert pages.latest("page-1", owner="ip:1.1.1.1")["text"] == "alice's notes"
+
+
+def test_regions_are_transcribed_one_at_a_time():
+    # /ocr holds one provider slot, so region calls must not fan out
+    edited = list(LINES)
+    edited[1] = "milk and bread"
+    edited[4] = "call the electrician on Monday"
+    active, peak = [0], [0]
+
+    def transcribe(image):
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        active[0] -= 1
+        return "NEW"
+
+    result = reocr(photo(LINES), "\n".join(LINES), photo(edited, (8, -6), 1.0, 0.92), transcribe)
+    assert result["regions"] == 2
+    assert peak[0] == 1
@@ -0,0 +1,58 @@
+import sys
+import textwrap
+import time
+
+import pytest
+
+from local_tts import PiperEngine, split_chunks
+
+
+@pytest.fixture
+def fake_piper(tmp_path):
+    """Stand-in for `piper --json-input` that writes a short WAV per line and hangs on "hang"."""
+    script = tmp_path / "piper"
+    script.write_text(textwrap.dedent(f"""\
+        #!{sys.executable}
+        import json, sys, time, wave
+        for line in sys.stdin:
+            request = json.loads(line)
+            if "hang" in request["text"]:
+                time.sleep(3600)
+            with wave.open(request["output_file"], "wb") as w:
+                w.setnchannels(1)
+                w.setsampwidth(2)
+                w.setframerate(16000)
+                w.writeframes(b"\\0\\0" * 160)
+            print(request["output_file"], flush=True)
+        """))
+    script.chmod(0o755)
+    return str(script)
+
+
+def test_piper_engine_synthesizes(fake_piper, tmp_path):
+    engine = PiperEngine(fake_piper, str(tmp_path / "model.onnx"), workers=1)
+    try:
+        assert engine.synthesize("hello").startswith(b"RIFF")
+    finally:
+        engine.close()
+
+
+def test_hung_piper_times_out_and_is_replaced(fake_piper, tmp_path, monkeypatch):
+    monkeypatch.setenv("PIPER_TIMEOUT", "0.5")
+    engine = PiperEngine(fake_piper, str(tmp_path / "model.onnx"), workers=1)
+    try:
+        start = time.monotonic()
+        with pytest.raises(TimeoutError):
+            engine.synthesize("please hang")
+        assert time.monotonic() - start < 5
+        # The wedged process was killed and a fresh one put back in the pool
+        assert engine.synthesize("hello again").startswith(b"RIFF")
+    finally:
+        engine.close()
+
+
+def test_split_chunks_respects_limit():
+    text = "One sentence. " * 50 + "x" * 500
+    chunks = split_chunks(text, max_chars=100)
+    assert all(len(c) <= 100 for c in chunks)
+    assert "".join(chunks).replace(" ", "") == text.replace(" ", "")
@@ -0,0 +1,58 @@
+import cv2
+import numpy as np
+import pytest
+
+from quality import REASON_BLANK, REASON_BLURRY, REASON_OVEREXPOSED, REASON_UNDEREXPOSED, QualityGate
+
+
+def page(lines=12, background=255, ink=0):
+    img = np.full((1200, 1600, 3), background, np.uint8)
+    for i in range(lines):
+        cv2.putText(img, f"Line {i}: the quick brown fox jumps over the dog", (60, 90 + i * 90),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.2, (ink, ink, ink), 2, cv2.LINE_AA)
+    return img
+
+
+def evaluate(img):
+    return QualityGate(mode="reject").evaluate(cv2.imencode(".png", img)[1].tobytes())
+
+
+@pytest.mark.parametrize("lines", [12, 3])
+def test_sharp_page_on_white_background_passes(lines):
+    result = evaluate(page(lines))
+
+    # Nearly the whole frame is clipped white, but none of the text is lost
+    assert result["metrics"]["overexposed_fraction"] > 0.85
+    assert result["ok"] and result["reasons"] == []
+
+
+def test_blurry_page_is_rejected_as_blurry():
+    result = evaluate(cv2.GaussianBlur(page(), (0, 0), 6))
+
+    assert not result["ok"]
+    assert result["reasons"] == [REASON_BLURRY]
+
+
+def test_blank_page_is_rejected_as_blank():
+    assert evaluate(np.full((1200, 1600, 3), 180, np.uint8))["reasons"] == [REASON_BLANK]
+
+
+def test_dark_page_is_rejected_as_underexposed():
+    assert evaluate(page(background=20, ink=35))["reasons"] == [REASON_UNDEREXPOSED]
+
+
+def test_glare_across_the_text_is_rejected_as_overexposed():
+    img = page()
+    # A blown-out band wipes the middle lines; the first and last lines survive
+    img[150:1000] = 255
+
+    result = evaluate(img)
+
+    assert result["metrics"]["overexposed_text_fraction"] > 0.5
+    assert result["reasons"] == [REASON_OVEREXPOSED]
+
+
+def test_flag_mode_reports_reasons_without_rejecting():
+    result = QualityGate(mode="flag").evaluate(cv2.imencode(".png", page(background=20, ink=35))[1].tobytes())
+
+    assert result["ok"] and result["reasons"] == [REASON_UNDEREXPOSED]
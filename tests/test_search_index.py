@@ -0,0 +1,34 @@
+from search_index import TranscriptIndex, build_match_query
+
+
+def test_search_is_scoped_to_owner(tmp_path):
+    index = TranscriptIndex(str(tmp_path / "search.sqlite3"))
+    index.add("ip:1.1.1.1:image:abc", "transcript", "alice's lab report on enzymes", owner="ip:1.1.1.1")
+    index.add("ip:2.2.2.2:image:abc", "transcript", "mallory's lab report", owner="ip:2.2.2.2")
+
+    alice = index.search("lab rep", owner="ip:1.1.1.1")
+    assert [r["snippet"].startswith("alice") for r in alice] == [True]
+    assert len(index.search("lab", owner="ip:2.2.2.2")) == 1
+    assert index.get(alice[0]["id"], owner="ip:2.2.2.2") is None
+
+
+def test_reindexing_a_key_keeps_its_owner(tmp_path):
+    index = TranscriptIndex(str(tmp_path / "search.sqlite3"))
+    doc_id = index.add("page:1", "transcript", "first draft", owner="ip:1.1.1.1")
+    assert index.add("page:1", "transcript", "second draft", owner="ip:2.2.2.2") is None
+
+    # The other owner's write is refused: the first owner's text is untouched
+    assert index.get(doc_id)["owner"] == "ip:1.1.1.1"
+    assert index.get(doc_id)["body"] == "first draft"
+    assert index.search("second", owner="ip:2.2.2.2") == []
+    assert index.search("second", owner="ip:1.1.1.1") == []
+    assert len(index.search("first", owner="ip:1.1.1.1")) == 1
+
+    # The owner itself can still replace its document
+    assert index.add("page:1", "transcript", "third draft", owner="ip:1.1.1.1") == doc_id
+    assert index.get(doc_id)["body"] == "third draft"
+
+
+def test_match_query_escapes_operators():
+    assert build_match_query('foo OR "bar" NEAR(') == '{body title} : ("foo" "or" "bar" "near"*)'
+    assert build_match_query("  ") is None
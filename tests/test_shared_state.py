@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+
+from shared_state import Cluster, MemoryState, SQLiteState
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def state(request, tmp_path):
+    if request.param == "memory":
+        return MemoryState()
+    return SQLiteState(str(tmp_path / "state.sqlite3"))
+
+
+def test_state_roundtrip_and_ttl(state):
+    state.set("a", {"x": 1})
+    state.set("b", "short", ttl=0.05)
+    assert state.get("a") == {"x": 1}
+    assert state.get("b") == "short"
+    time.sleep(0.1)
+    assert state.get("b") is None
+    state.delete("a")
+    assert state.get("a") is None
+
+
+def test_state_add_is_exclusive_until_expiry(state):
+    assert state.add("lease", "one", ttl=0.05)
+    assert not state.add("lease", "two", ttl=0.05)
+    assert state.get("lease") == "one"
+    time.sleep(0.1)
+    assert state.add("lease", "three")
+    assert state.get("lease") == "three"
+
+
+def test_sqlite_add_has_one_winner_across_connections(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    winners = []
+
+    def contend(i):
+        # Each thread gets its own connection, like separate processes would
+        if SQLiteState(path).add("lease", i, ttl=10):
+            winners.append(i)
+
+    threads = [threading.Thread(target=contend, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(winners) == 1
+
+
+def test_memory_state_evicts_oldest_past_cap():
+    state = MemoryState(max_keys=10)
+    for i in range(25):
+        state.set(f"k{i}", i)
+    assert len(state._data) <= 10
+    assert state.get("k24") == 24
+    assert state.get("k0") is None
+
+
+def test_cluster_cache_can_be_disabled(monkeypatch):
+    monkeypatch.setenv("CACHE_TTL", "0")
+    cluster = Cluster(MemoryState(), node_id="a")
+    cluster.cache_set("ocr", "k", "text")
+    assert cluster.cache_get("ocr", "k") is None
+
+    monkeypatch.setenv("CACHE_TTL", "60")
+    cluster = Cluster(MemoryState(), node_id="a")
+    cluster.cache_set("ocr", "k", "text")
+    assert cluster.cache_get("ocr", "k") == "text"
+
+
+def test_cluster_artifact_locations_between_nodes():
+    state = MemoryState()
+    a = Cluster(state, node_id="a", node_url="http://a")
+    b = Cluster(state, node_id="b", node_url="http://b")
+    a.register_artifact("voices", "v1.mp3", ref="voice-1")
+
+    assert b.locate_ref("voices", "voice-1")["name"] == "v1.mp3"
+    assert b.held_elsewhere("voices", "v1.mp3")
+    # A node's own record says nothing about whether the file is still on its disk
+    assert not a.held_elsewhere("voices", "v1.mp3")
+
+
+def test_forget_artifact_drops_location_and_linked_cache():
+    state = MemoryState()
+    a = Cluster(state, node_id="a", node_url="http://a")
+    b = Cluster(state, node_id="b", node_url="http://b")
+    a.register_artifact("audio", "out.mp3")
+    a.cache_set("tts", "key", "out.mp3", artifact=("audio", "out.mp3"))
+
+    # A replica being deleted on another node leaves the original alone
+    b.forget_artifact("audio", "out.mp3")
+    assert b.locate_artifact("audio", "out.mp3")
+    assert b.cache_get("tts", "key") == "out.mp3"
+
+    a.forget_artifact("audio", "out.mp3")
+    assert b.locate_artifact("audio", "out.mp3") is None
+    assert b.cache_get("tts", "key") is None
+
+
+def test_sqlite_state_purges_expired_rows(tmp_path):
+    state = SQLiteState(str(tmp_path / "state.sqlite3"), purge_every=10)
+    for i in range(5):
+        state.set(f"short{i}", i, ttl=0.05)
+    state.set("keep", "value")
+    time.sleep(0.1)
+    for i in range(4):
+        state.set(f"later{i}", i, ttl=60)
+
+    rows = state._conn().execute("SELECT key FROM kv").fetchall()
+    assert sorted(key for (key,) in rows) == ["keep", "later0", "later1", "later2", "later3"]
@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+
+from shared_state import MemoryState, SQLiteState
+from singleflight import FlightFailed, SharedSingleFlight, SingleFlight
+
+
+def test_single_flight_shares_one_call():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return "value"
+
+    threads = [threading.Thread(target=lambda: results.append(flights.do("k", compute))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert {value for value, _ in results} == {"value"}
+
+
+def shared_pair(tmp_path):
+    # Two "processes": separate local layers over one store
+    path = str(tmp_path / "state.sqlite3")
+    return (SharedSingleFlight(SQLiteState(path), poll_interval=0.01),
+            SharedSingleFlight(SQLiteState(path), poll_interval=0.01))
+
+
+def test_shared_flight_waiter_gets_leaders_result(tmp_path):
+    a, b = shared_pair(tmp_path)
+    started = threading.Event()
+    out = {}
+
+    def leader():
+        def compute():
+            started.set()
+            time.sleep(0.2)
+            return "from a"
+        out["a"] = a.do("k", compute)
+
+    t = threading.Thread(target=leader)
+    t.start()
+    started.wait(5)
+    out["b"] = b.do("k", lambda: "from b")
+    t.join()
+
+    assert out["a"] == ("from a", False)
+    assert out["b"] == ("from a", True)
+
+
+def test_shared_flight_never_returns_a_previous_flights_result(tmp_path):
+    a, b = shared_pair(tmp_path)
+    assert a.do("k", lambda: "old") == ("old", False)
+
+    # A new flight starts within the old result's TTL; its waiters must get the new value
+    started = threading.Event()
+    out = {}
+
+    def leader():
+        def compute():
+            started.set()
+            time.sleep(0.2)
+            return "new"
+        out["a"] = a.do("k", compute)
+
+    t = threading.Thread(target=leader)
+    t.start()
+    started.wait(5)
+    out["b"] = b.do("k", lambda: "unexpected")
+    t.join()
+
+    assert out["b"] == ("new", True)
+
+
+def test_shared_flight_propagates_errors(tmp_path):
+    a, b = shared_pair(tmp_path)
+    started = threading.Event()
+
+    def fail():
+        started.set()
+        time.sleep(0.2)
+        raise ValueError("provider down")
+
+    t = threading.Thread(target=lambda: pytest.raises(ValueError, a.do, "k", fail))
+    t.start()
+    started.wait(5)
+    with pytest.raises(FlightFailed, match="provider down"):
+        b.do("k", lambda: "unexpected")
+    t.join()
+
+
+def test_shared_flight_takes_over_expired_lease():
+    state = MemoryState()
+    state.add("flight:lease:k", "dead-leader", ttl=0.1)
+    flights = SharedSingleFlight(state, poll_interval=0.01)
+    assert flights.do("k", lambda: "recovered") == ("recovered", False)
@@ -0,0 +1,56 @@
+import time
+
+from storage import ArtifactIndex, ArtifactStore, LocalBackend
+
+
+def make_store(tmp_path, **retention):
+    store = ArtifactStore(LocalBackend(str(tmp_path / "files")), ArtifactIndex(str(tmp_path / "index.sqlite3")),
+                          legacy_root=str(tmp_path / "legacy"))
+    store.retention = {kind: (0, 0) for kind in store.retention}
+    store.retention.update(retention)
+    return store
+
+
+def put(store, kind, name, size, last_access=None):
+    path = store.new_path(kind, name)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    store.commit(kind, name, path, ref=f"ref-{name}")
+    if last_access is not None:
+        store.index.touch(kind, name, last_access)
+
+
+def test_gc_removes_expired(tmp_path):
+    store = make_store(tmp_path, audio=(3600, 0))
+    put(store, "audio", "old.mp3", 10, last_access=time.time() - 7200)
+    put(store, "audio", "new.mp3", 10)
+
+    removed = store.collect_garbage()
+
+    assert removed == {"expired": 1, "evicted": 0, "bytes": 10}
+    assert store.open_path("audio", "old.mp3") is None
+    assert store.open_path("audio", "new.mp3")
+
+
+def test_gc_evicts_least_recently_used_over_cap(tmp_path):
+    store = make_store(tmp_path, voices=(0, 250))
+    now = time.time()
+    for i, name in enumerate(["a", "b", "c"]):
+        put(store, "voices", name, 100, last_access=now - 100 + i)
+
+    removed = store.collect_garbage()
+
+    assert removed["evicted"] == 1
+    assert store.open_path("voices", "a") is None
+    assert store.open_path("voices", "b") and store.open_path("voices", "c")
+
+
+def test_gc_notifies_delete_listeners(tmp_path):
+    store = make_store(tmp_path, audio=(3600, 0))
+    deleted = []
+    store.on_delete(lambda kind, name, ref: deleted.append((kind, name, ref)))
+    put(store, "audio", "old.mp3", 10, last_access=time.time() - 7200)
+
+    store.collect_garbage()
+
+    assert deleted == [("audio", "old.mp3", "ref-old.mp3")]
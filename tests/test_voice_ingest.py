@@ -0,0 +1,74 @@
+import io
+import wave
+
+import numpy as np
+import pytest
+
+from voice_ingest import FRAME_MS, VoiceIngestError, frame_levels, ingest_voice, speech_mask
+
+
+def make_wav(samples, rate=44100, channels=2):
+    """Encode float samples in [-1, 1] as 16-bit PCM, copied to every channel."""
+    ints = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(np.repeat(ints, channels).tobytes())
+    return buf.getvalue()
+
+
+def speech_like(seconds, rate=44100, speech_seconds=None, level=0.05):
+    """Voiced 200 ms bursts separated by 100 ms pauses over a faint noise floor."""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * rate)) / rate
+    tone = np.sin(2 * np.pi * 180 * t) + 0.5 * np.sin(2 * np.pi * 360 * t)
+    bursts = (t % 0.3) < 0.2
+    if speech_seconds is not None:
+        bursts &= t < speech_seconds
+    return level * tone * bursts + 0.0005 * rng.standard_normal(len(t))
+
+
+def read_wav(data):
+    with wave.open(io.BytesIO(data), "rb") as w:
+        raw = w.readframes(w.getnframes())
+        return np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0, w.getframerate(), w.getnchannels()
+
+
+def test_long_stereo_sample_becomes_short_normalized_mono_clip():
+    result = ingest_voice(make_wav(speech_like(40)), sample_rate=24000, max_seconds=15, min_seconds=3, fmt="wav")
+
+    samples, rate, channels = read_wav(result["data"])
+    assert (result["format"], result["sampleRate"], rate, channels) == ("wav", 24000, 24000, 1)
+    assert result["inputDurationSec"] == 40.0
+    assert 14.0 <= result["durationSec"] <= 15.0
+    assert len(samples) / rate == pytest.approx(result["durationSec"], abs=0.01)
+
+    levels, _ = frame_levels(samples, rate * FRAME_MS // 1000)
+    voiced = samples[: len(levels) * (rate * FRAME_MS // 1000)].reshape(len(levels), -1)[speech_mask(levels)]
+    assert 20 * np.log10(np.sqrt(np.mean(voiced ** 2))) == pytest.approx(-20.0, abs=1.5)
+
+
+def test_reference_length_follows_env(monkeypatch):
+    monkeypatch.setenv("VOICE_REFERENCE_SECONDS", "6")
+
+    result = ingest_voice(make_wav(speech_like(20)), fmt="wav")
+
+    assert result["durationSec"] <= 6.0
+    assert result["sampleRate"] == 24000
+
+
+@pytest.mark.parametrize("samples", [
+    np.zeros(44100 * 10),
+    speech_like(10, level=0.0),
+    speech_like(10, speech_seconds=1.0),
+], ids=["digital-silence", "noise-only", "too-little-speech"])
+def test_sample_without_enough_speech_is_rejected(samples):
+    with pytest.raises(VoiceIngestError):
+        ingest_voice(make_wav(samples), min_seconds=3, fmt="wav")
+
+
+def test_empty_sample_is_rejected():
+    with pytest.raises(VoiceIngestError, match="empty"):
+        ingest_voice(make_wav(np.zeros(100)), fmt="wav")